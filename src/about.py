@@ -18,49 +18,55 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import functools
+
 from gi.repository import Adw, Gtk
 
 
-about_dialog = Adw.AboutDialog(
-    application_name='Data Recovery',
-    application_icon='datarecovery',
-    website='https://github.com/koxt2/datarecovery',
-    issue_url='https://github.com/koxt2/datarecovery/issues',
-    developer_name='koxt2',
-    version='0.1.0',
-    copyright='© 2025 koxt2',
-    license_type=Gtk.License.GPL_2_0
-)
+@functools.lru_cache(maxsize=1)
+def get_about_dialog():
+    # Built on first use rather than at import so startup doesn't pay for it
+    about_dialog = Adw.AboutDialog(
+        application_name='Data Recovery',
+        application_icon='datarecovery',
+        website='https://github.com/koxt2/datarecovery',
+        issue_url='https://github.com/koxt2/datarecovery/issues',
+        developer_name='koxt2',
+        version='0.1.0',
+        copyright='© 2025 koxt2',
+        license_type=Gtk.License.GPL_2_0
+    )
 
-# Add legal sections for acknowledgements (similar to Wike)
-about_dialog.add_legal_section(
-    'PhotoRec',
-    '© CGSecurity',
-    Gtk.License.GPL_2_0,
-    'https://www.cgsecurity.org/wiki/PhotoRec'
-)
+    # Add legal sections for acknowledgements (similar to Wike)
+    about_dialog.add_legal_section(
+        'PhotoRec',
+        '© CGSecurity',
+        Gtk.License.GPL_2_0,
+        'https://www.cgsecurity.org/wiki/PhotoRec'
+    )
 
-about_dialog.add_legal_section(
-    'rdfind',
-    '© Paul Dreik',
-    Gtk.License.GPL_2_0,
-    'https://rdfind.pauldreik.se/'
-)
+    about_dialog.add_legal_section(
+        'rdfind',
+        '© Paul Dreik',
+        Gtk.License.GPL_2_0,
+        'https://rdfind.pauldreik.se/'
+    )
 
-about_dialog.add_legal_section(
-    'ddrescue',
-    '© GNU Project',
-    Gtk.License.GPL_3_0,
-    'https://www.gnu.org/software/ddrescue/'
-)
+    about_dialog.add_legal_section(
+        'ddrescue',
+        '© GNU Project',
+        Gtk.License.GPL_3_0,
+        'https://www.gnu.org/software/ddrescue/'
+    )
 
-# Add acknowledgement section with plain strings (for compatibility)
-about_dialog.add_acknowledgement_section(
-    'Acknowledgements',
-    [
-        'photorec - https://www.cgsecurity.org/wiki/PhotoRec',
-        'rdfind - https://rdfind.pauldreik.se/',
-        'ddrescue - https://www.gnu.org/software/ddrescue/'
-    ]
-)
-#about_dialog.set_translator_credits(_('translator-credits'))
+    # Add acknowledgement section with plain strings (for compatibility)
+    about_dialog.add_acknowledgement_section(
+        'Acknowledgements',
+        [
+            'photorec - https://www.cgsecurity.org/wiki/PhotoRec',
+            'rdfind - https://rdfind.pauldreik.se/',
+            'ddrescue - https://www.gnu.org/software/ddrescue/'
+        ]
+    )
+    #about_dialog.set_translator_credits(_('translator-credits'))
+    return about_dialog
@@ -19,15 +19,15 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 import os
+import signal
 import threading
-import subprocess
 from gi.repository import Adw, Gtk, GLib
 
 from .log import setup_datarecovery_logging
 from .mounted_check import MountedPartitionChecker
 from .image import pkexec_ddrescue
 from .recover import photorec_recover
-from .organise_files import organize_and_cleanup
+from .organise_files import organize_and_cleanup, fast_copy
 from .preflight import check_tools_exist
 
 logger = None
@@ -37,9 +37,35 @@ class DataRecoveryController:
     def __init__(self, window):
         self.window = window
         self.current_thread = None
-        self.cancel_requested = False
+        self.cancel_event = threading.Event()
         self.recovery_dialog = None
         self.current_process = None
+        self.cancel_read_fd = None
+        self.cancel_write_fd = None
+        # Callbacks run on cancel, e.g. to terminate running scans
+        self._cancel_callbacks = []
+        self._cancel_lock = threading.Lock()
+        # Upper bound on concurrent file moves while organising
+        self.max_concurrency = max(4, os.cpu_count() or 1)
+    
+    @property
+    def cancel_requested(self):
+        return self.cancel_event.is_set()
+
+    def register_cancel_callback(self, callback):
+        # Run callback on cancel, or straight away if already cancelled
+        with self._cancel_lock:
+            if not self.cancel_event.is_set():
+                self._cancel_callbacks.append(callback)
+                return
+        callback()
+    
+    def unregister_cancel_callback(self, callback):
+        with self._cancel_lock:
+            try:
+                self._cancel_callbacks.remove(callback)
+            except ValueError:
+                pass
     
     def toast(self, message):
         toast = Adw.Toast.new(message)
@@ -71,8 +97,10 @@ class DataRecoveryController:
             self.toast("Please select both device and destination")
             return
         
-        # Reset cancel flag
-        self.cancel_requested = False
+        # Reset cancel flag and open a fresh fd used to wake the helper on cancel
+        self.cancel_event.clear()
+        self._close_cancel_pipe()
+        self.cancel_read_fd, self.cancel_write_fd = self._open_cancel_pipe()
         
         # Show cancellation dialog
         self.recovery_dialog = Adw.AlertDialog.new("Data Recovery in Progress", None)
@@ -82,39 +110,31 @@ class DataRecoveryController:
         
         def on_cancel_response(dialog_obj, response):
             if response == "cancel":
-                self.cancel_requested = True
+                with self._cancel_lock:
+                    self.cancel_event.set()
+                    callbacks = list(self._cancel_callbacks)
+                for callback in callbacks:
+                    try:
+                        callback()
+                    except Exception as e:
+                        logger.error(f"Error running cancel callback: {e}")
                 
-                # Create cancel flag file that the helper will check
+                # Wake the helper through the cancel fd
                 try:
-                    if hasattr(self, 'cancel_file_path') and self.cancel_file_path:
-                        # Use the secure cancel file path provided by the helper
-                        with open(self.cancel_file_path, 'w') as f:
-                            f.write('cancel')
-                        logger.info(f"Cancellation requested - created cancel flag file: {self.cancel_file_path}")
-                    elif self.current_process:
-                        # Fallback to old method if cancel file path not available
-                        helper_pid = self.current_process.pid
-                        cancel_file = f'/tmp/datarecovery_cancel_{helper_pid}'
-                        with open(cancel_file, 'w') as f:
-                            f.write('cancel')
-                        logger.info(f"Cancellation requested - created cancel flag file: {cancel_file}")
+                    if self.cancel_write_fd is not None:
+                        if self.cancel_write_fd == self.cancel_read_fd:
+                            os.eventfd_write(self.cancel_write_fd, 1)
+                        else:
+                            os.write(self.cancel_write_fd, b'x')
+                        logger.info("Cancellation requested - signalled helper through cancel fd")
                 except Exception as e:
-                    logger.error(f"Error creating cancel flag: {e}")
+                    logger.error(f"Error signalling cancellation: {e}")
                 
-                # Also try to terminate the process directly
+                # Also signal the process directly, the recovery thread waits for it to exit
                 if self.current_process and self.current_process.poll() is None:
                     try:
                         logger.info("Terminating current recovery process...")
-                        self.current_process.terminate()
-                        # Give it a moment to see the cancel flag and terminate gracefully
-                        try:
-                            self.current_process.wait(timeout=15)
-                            logger.info("Recovery process terminated successfully")
-                        except subprocess.TimeoutExpired:
-                            logger.warning("Recovery process didn't terminate gracefully, forcing termination...")
-                            self.current_process.kill()
-                            self.current_process.wait()
-                            logger.info("Recovery process forcefully terminated")
+                        self.current_process.send_signal(signal.SIGTERM)
                     except Exception as e:
                         logger.error(f"Error terminating recovery process: {e}")
                 
@@ -136,8 +156,27 @@ class DataRecoveryController:
         all_block_devices = self.window.device_dropdown_manager.devices + self.window.device_dropdown_manager.partitions
         mount_checker = MountedPartitionChecker(self.window, all_block_devices, logger)
 
+        # Snapshot the options on the main thread so toggling them mid-recovery has no effect
+        opts = {
+            'save_image': self.window.save_image_switch.get_active(),
+            'enable_logs': self.window.log_switch.get_active(),
+            'keep_corrupted_files': self.window.corrupted_switch.get_active(),
+            'remove_duplicates': self.window.dupes_switch.get_active(),
+        }
+
+        # Work out the source layout here as well so the recovery thread never reads GTK state
+        dropdown_manager = self.window.device_dropdown_manager
+        is_image_file = not device.startswith('/dev/')
+        device_partitions = [] if is_image_file else dropdown_manager.partitions_by_device.get(device, [])
+        scan_partitions = not is_image_file and self.window.scan_partitions_switch.get_active()
+        opts['is_image_file'] = is_image_file
+        opts['scan_partitions'] = scan_partitions
+        opts['device_partitions'] = device_partitions
+        opts['device_partition_paths'] = [p['path'] for p in device_partitions] if scan_partitions else []
+        opts['partitions_data'] = list(dropdown_manager.partitions)
+
         def proceed_with_recovery():
-            self.current_thread = threading.Thread(target=self._run_recovery_process, args=(device, dest, working_dir), daemon=True)
+            self.current_thread = threading.Thread(target=self._run_recovery_process, args=(device, dest, working_dir, opts), daemon=True)
             self.current_thread.start()
 
         mount_checker.check_and_handle_mounted_partitions(device, dest, proceed_with_recovery)
@@ -164,29 +203,26 @@ class DataRecoveryController:
             dialog.connect("response", on_response)
             dialog.present(self.window)
 
-    def _run_recovery_process(self, device, dest, working_dir):
+    def _run_recovery_process(self, device, dest, working_dir, opts):
         try:
             if self.cancel_requested:
                 self.set_output_label("Recovery cancelled")
                 return
                 
             self.set_output_label("Starting data recovery...")
-            logger.info("\nStarting Data Recovery Process...")
-            logger.info(f"Source: {device}")
-            logger.info(f"Destination path: {dest}")
-            logger.info(f"Using working directory: {working_dir}")
+            logger.info("\nStarting Data Recovery Process...\n"
+                        "Source: %s\n"
+                        "Destination path: %s\n"
+                        "Using working directory: %s", device, dest, working_dir)
 
             # Check if the source is already an image file
-            is_image_file = not device.startswith('/dev/')
-
-            if is_image_file:
+            if opts['is_image_file']:
                 if self.cancel_requested:
                     self.set_output_label("Recovery cancelled")
                     return
                     
                 logger.info("Source is an image file - skipping ddrescue phase")
                 # Copy the image file to the working directory for photorec
-                import shutil
                 image_filename = os.path.basename(device)
                 working_image_path = os.path.join(working_dir, image_filename)
 
@@ -194,8 +230,18 @@ class DataRecoveryController:
                     self.set_output_label("Copying image file to working directory...")
                     logger.info(f"Copying {device} to {working_image_path}")
                     try:
-                        shutil.copy2(device, working_image_path)
-                        logger.info("Image file copied successfully")
+                        # A hard link avoids copying the whole image when both are on the same filesystem
+                        linked = False
+                        if os.stat(device).st_dev == os.stat(working_dir).st_dev:
+                            try:
+                                os.link(device, working_image_path)
+                                linked = True
+                                logger.info("Image file hard linked into working directory")
+                            except OSError as e:
+                                logger.info(f"Could not hard link image file ({e}), copying instead")
+                        if not linked:
+                            fast_copy(device, working_image_path)
+                            logger.info("Image file copied successfully")
                     except Exception as e:
                         self.set_output_label("Failed to copy image file. Aborting recovery process.")
                         logger.error(f"Failed to copy image file: {e}")
@@ -206,15 +252,11 @@ class DataRecoveryController:
                     return
                     
                 # If whole device is selected and scan_partitions_switch is enabled, 
-                # make a list of all the partitions on that device for separate imaging
-                device_partition_paths = []
-                scan_partitions = self.window.scan_partitions_switch.get_active()
-
-                if scan_partitions:
-                    for partition in self.window.device_dropdown_manager.partitions:
-                        if partition['path'].startswith(device) and partition['path'] != device:
-                            device_partition_paths.append(partition['path'])
+                # all the partitions on that device are imaged separately
+                device_partitions = opts['device_partitions']
+                device_partition_paths = opts['device_partition_paths']
 
+                if opts['scan_partitions']:
                     if device_partition_paths:
                         logger.info(f"Will create separate images for {len(device_partition_paths)} partitions: {device_partition_paths}")
                     else:
@@ -229,7 +271,7 @@ class DataRecoveryController:
                     
                 self.set_output_label("Creating device image...")
                 logger.info("\n=== Phase 1: Creating Disk Image ===")
-                imaging_success = pkexec_ddrescue(device, working_dir, device_partition_paths, self.window.device_dropdown_manager.partitions, self)
+                imaging_success = pkexec_ddrescue(device, working_dir, device_partition_paths, device_partitions, self)
                 if not imaging_success:
                     self.set_output_label("Failed to create device image. Aborting recovery process.")
                     logger.error("Failed to create device image. Aborting recovery process.")
@@ -244,17 +286,17 @@ class DataRecoveryController:
             logger.info("\n=== Phase 2: Running File Recovery ===")
 
             # Get selected options
-            save_image = self.window.save_image_switch.get_active()
-            enable_logs = self.window.log_switch.get_active()
-            keep_corrupted_files = self.window.corrupted_switch.get_active()
-            remove_duplicates = self.window.dupes_switch.get_active()
-            logger.info(f"Save image files: {save_image}")
-            logger.info(f"Enable PhotoRec logs: {enable_logs}")
-            logger.info(f"Keep corrupted files: {keep_corrupted_files}")
-            logger.info(f"Remove duplicate files: {remove_duplicates}")
+            save_image = opts['save_image']
+            enable_logs = opts['enable_logs']
+            keep_corrupted_files = opts['keep_corrupted_files']
+            remove_duplicates = opts['remove_duplicates']
+            logger.info("Save image files: %s\n"
+                        "Enable PhotoRec logs: %s\n"
+                        "Keep corrupted files: %s\n"
+                        "Remove duplicate files: %s", save_image, enable_logs, keep_corrupted_files, remove_duplicates)
 
             recovery_success = photorec_recover(dest, working_dir=working_dir, 
-                                     partitions_data=self.window.device_dropdown_manager.partitions, enable_logs=enable_logs,
+                                     partitions_data=opts['partitions_data'], enable_logs=enable_logs,
                                      keep_corrupted_files=keep_corrupted_files, controller=self)
 
             if not recovery_success:
@@ -286,4 +328,24 @@ class DataRecoveryController:
         if self.recovery_dialog:
             self.recovery_dialog.close()
             self.recovery_dialog = None
+        self._close_cancel_pipe()
+
+    @staticmethod
+    def _open_cancel_pipe():
+        # An eventfd is a single fd that polls readable once written to. Fall
+        # back to a pipe where os.eventfd isn't available (Python < 3.10, non-Linux)
+        if hasattr(os, 'eventfd'):
+            fd = os.eventfd(0, os.EFD_CLOEXEC)
+            return fd, fd
+        return os.pipe()
+
+    def _close_cancel_pipe(self):
+        for fd in {self.cancel_read_fd, self.cancel_write_fd}:
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.cancel_read_fd = None
+        self.cancel_write_fd = None
     
@@ -19,11 +19,32 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 import re
+import logging
 
 import gi
 gi.require_version('Gio', '2.0')
 from gi.repository import Gio, GLib
 
+logger = logging.getLogger('DataRecovery')
+
+BLOCK_DEVICES_PATH = '/org/freedesktop/UDisks2/block_devices/'
+
+# Delay used to coalesce udisks2 change signals before refreshing the device list
+REFRESH_DELAY_MS = 50
+
+# Classifies a path as a whole device (sda, nvme0n1, mmcblk0) or a partition (sda1, nvme0n1p1,
+# mmcblk0p1) in one match, capturing the name of the device a partition belongs to
+_BLOCK_PATH_RE = re.compile(
+    r'/dev/(?:(?P<device>sd[a-z]|nvme\d+n\d+|mmcblk\d+)'
+    r'|(?P<parent>sd[a-z](?=\d)|(?:nvme\d+n\d+|mmcblk\d+)(?=p))p?\d+)')
+
+# udisks2 Block properties that are mirrored into the device info dict
+_BLOCK_PROPERTY_KEYS = {
+    'Size': 'size',
+    'IdType': 'id_type',
+    'IdLabel': 'label',
+}
+
 def udisks2_block_devices():
     devices, partitions = [], []
     
@@ -34,53 +55,81 @@ def udisks2_block_devices():
             'org.freedesktop.UDisks2', '/org/freedesktop/UDisks2', None, None, None)
         
         for obj in manager.get_objects():
-            block = obj.get_interface('org.freedesktop.UDisks2.Block')
-            if not block:
+            # Skip drives, jobs etc. before asking for any interfaces
+            if not obj.get_object_path().startswith(BLOCK_DEVICES_PATH):
                 continue
             
-            path = _get_device_path(block)
-            model, serial = _get_drive_info(manager, block)
-            
-            # Get mount status and path
-            filesystem = obj.get_interface('org.freedesktop.UDisks2.Filesystem')
-            mount_points = []
-            if filesystem:
-                mount_points = filesystem.get_cached_property('MountPoints').unpack()
-            is_mounted = bool(mount_points and len(mount_points) > 0)
-            mount_path = None
-            if is_mounted and mount_points[0]:
-                # Mount points come as list of byte values, convert to string
-                if isinstance(mount_points[0], list):
-                    mount_path = bytes(mount_points[0]).decode('utf-8').rstrip('\x00')
-                elif isinstance(mount_points[0], (bytes, bytearray)):
-                    mount_path = mount_points[0].decode('utf-8').rstrip('\x00')
-                else:
-                    mount_path = str(mount_points[0]).rstrip('\x00')
-
-            info = {
-                'path': path,
-                'model': model,
-                'serial': serial,
-                'size': block.get_cached_property('Size').unpack(),
-                'id_type': block.get_cached_property('IdType').unpack(),
-                'label': block.get_cached_property('IdLabel').unpack(),
-                'partition_type': _get_partition_type(obj, block),
-                'mounted': is_mounted,
-                'mount_path': mount_path,
-            }
-            
-            if _is_device(path):
+            kind, info = _get_block_device_info(manager, obj)
+            if kind == 'devices':
                 devices.append(info)
-            elif _is_partition(path):
+            elif kind == 'partitions':
                 partitions.append(info)
                 
     except Exception as e:
-        print(f"Failed to list block devices via UDisks2: {e}")
+        logger.error("Failed to list block devices via UDisks2: %s", e)
     
     return devices, partitions
 
-def _get_device_path(block_interface):
-    device = block_interface.get_cached_property('Device').unpack()
+def _get_block_device_info(manager, obj):
+    # Build the info dict for a single udisks2 object. Returns (kind, info) where kind is
+    # 'devices' or 'partitions', or (None, None) if it isn't a whole device or partition
+    block = obj.get_interface('org.freedesktop.UDisks2.Block')
+    if not block:
+        return None, None
+    
+    block_props = _get_properties(block, ('Device', 'Drive', 'Size', 'IdType', 'IdLabel'))
+    path = _get_device_path(block_props['Device'])
+    match = _BLOCK_PATH_RE.fullmatch(path)
+    if not match:
+        return None, None
+    kind = 'devices' if match['device'] else 'partitions'
+    parent_path = f"/dev/{match['parent']}" if match['parent'] else None
+    
+    model, serial = _get_drive_info(manager, block_props['Drive'])
+    
+    # Get mount status and path
+    filesystem = obj.get_interface('org.freedesktop.UDisks2.Filesystem')
+    mount_points = []
+    if filesystem:
+        mount_points = _get_properties(filesystem, ('MountPoints',))['MountPoints'] or []
+    is_mounted, mount_path = _get_mount_info(mount_points)
+
+    return kind, {
+        'path': path,
+        'model': model,
+        'serial': serial,
+        'size': block_props['Size'],
+        'id_type': block_props['IdType'],
+        'label': block_props['IdLabel'],
+        'partition_type': _get_partition_type(obj),
+        'parent_path': parent_path,
+        'mounted': is_mounted,
+        'mount_path': mount_path,
+    }
+
+def group_partitions_by_device(partitions):
+    # Map each whole device path to the list of its partitions
+    grouped = {}
+    for partition in partitions:
+        grouped.setdefault(partition.get('parent_path'), []).append(partition)
+    return grouped
+
+def _get_properties(interface_proxy, names):
+    # Read and unpack a set of properties from an interface proxy in one pass.
+    # The object manager keeps these cached locally, so no DBus round-trip is made
+    props = {}
+    for name in names:
+        value = interface_proxy.get_cached_property(name)
+        props[name] = value.unpack() if value is not None else None
+    return props
+
+def _get_mount_info(mount_points):
+    # MountPoints is an array of NUL terminated byte strings, only the first is used
+    is_mounted = bool(mount_points)
+    mount_path = bytes(mount_points[0]).rstrip(b'\x00').decode('utf-8', 'replace') if is_mounted else None
+    return is_mounted, mount_path
+
+def _get_device_path(device):
     if isinstance(device, (bytes, bytearray)):
         return device.decode('utf-8').rstrip('\x00')
     elif isinstance(device, list):
@@ -88,10 +137,9 @@ def _get_device_path(block_interface):
     else:
         return str(device)
 
-def _get_drive_info(manager, block_interface):
+def _get_drive_info(manager, drive_path):
     #Get model and serial from drive interface if available
-    drive_path = block_interface.get_cached_property('Drive').unpack()
-    if not drive_path:
+    if not drive_path or drive_path == '/':
         return None, None
     
     drive_obj = manager.get_object(drive_path)
@@ -102,53 +150,40 @@ def _get_drive_info(manager, block_interface):
     if not drive:
         return None, None
     
-    model = drive.get_cached_property('Model').unpack()
-    serial = drive.get_cached_property('Serial').unpack()
-    return model, serial
+    drive_props = _get_properties(drive, ('Model', 'Serial'))
+    return drive_props['Model'], drive_props['Serial']
 
-def _get_partition_type(obj, block_interface):
+def _get_partition_type(obj):
     partition = obj.get_interface('org.freedesktop.UDisks2.Partition')
     if not partition:
         return None
     
-    # Try to get partition type GUID first (for GPT)
-    partition_type = partition.get_cached_property('Type')
-    if partition_type:
-        return partition_type.unpack()
+    partition_props = _get_properties(partition, ('Type', 'TypeID'))
+    
+    # Try to get partition type GUID first (for GPT). Lower-case it here, once,
+    # to match the keys of PARTITION_TYPE_GUIDS
+    if partition_props['Type']:
+        return partition_props['Type'].lower()
     
     # For MBR partitions, get the type ID
-    type_id = partition.get_cached_property('TypeID')
-    if type_id:
-        return f"0x{type_id.unpack():02x}"
+    if partition_props['TypeID']:
+        return f"0x{partition_props['TypeID']:02x}"
     
     return None
 
-def _is_device(path):
-    # Check to see if it a device
-    patterns = [
-        re.compile(r'^/dev/sd[a-z]$'),
-        re.compile(r'^/dev/nvme\d+n\d+$'),
-        re.compile(r'^/dev/mmcblk\d+$')
-    ]
-    return any(p.match(path) for p in patterns)
-
-def _is_partition(path):
-    # Check to see if it a partition
-    patterns = [
-        re.compile(r'^/dev/sd[a-z][0-9]+$'),
-        re.compile(r'^/dev/nvme\d+n\d+p\d+$'),
-        re.compile(r'^/dev/mmcblk\d+p\d+$')
-    ]
-    return any(p.match(path) for p in patterns)
 
 
 class UDisks2Monitor:
     # Monitor for changes to block devices... un/mount, device added/removed etc
+    # Keeps a cache of block device info keyed by object path so that each signal
+    # only re-reads the object that changed rather than rescanning every device
 
     def __init__(self, callback=None):
         self.callback = callback
         self.manager = None
         self.bus = None
+        self._cache = {'devices': {}, 'partitions': {}}
+        self._pending_refresh = 0
         self._setup_monitor()
     
     def _setup_monitor(self):
@@ -159,52 +194,139 @@ class UDisks2Monitor:
                 self.bus, Gio.DBusObjectManagerClientFlags.NONE,
                 'org.freedesktop.UDisks2', '/org/freedesktop/UDisks2', None, None, None)
             
+            # Prime the cache with the current block devices
+            for obj in self.manager.get_objects():
+                if obj.get_object_path().startswith(BLOCK_DEVICES_PATH):
+                    self._cache_object(obj)
+            
             # Connect to object added/removed signals
-            self.manager.connect('object-added', self._on_object_changed)
-            self.manager.connect('object-removed', self._on_object_changed)
+            self.manager.connect('object-added', self._on_object_added)
+            self.manager.connect('object-removed', self._on_object_removed)
             
             # Connect to interface property changes (for mount/unmount events)
             self.manager.connect('interface-proxy-properties-changed', self._on_properties_changed)
             
-            print("UDisks2 monitor initialized successfully")
+            logger.info("UDisks2 monitor initialized successfully")
             
         except Exception as e:
-            print(f"Failed to initialize UDisks2 monitor: {e}")
+            logger.error("Failed to initialize UDisks2 monitor: %s", e)
     
-    def _on_object_changed(self, manager, obj):
+    def _cache_object(self, obj):
+        # Add or replace the cached info for a single object, returns True if it was cached
+        kind, info = _get_block_device_info(self.manager, obj)
+        if not kind:
+            return False
+        self._cache[kind][obj.get_object_path()] = info
+        return True
+    
+    def _on_object_added(self, manager, obj):
         object_path = obj.get_object_path()
         
         # Only care about block devices, not jobs or other objects
-        if not object_path.startswith('/org/freedesktop/UDisks2/block_devices/'):
+        if not object_path.startswith(BLOCK_DEVICES_PATH):
             return
             
-        print(f"UDisks2: Device added/removed: {object_path}")
-        self._notify_change()
+        logger.debug("UDisks2: Device added: %s", object_path)
+        try:
+            if self._cache_object(obj):
+                self._notify_change()
+        except Exception as e:
+            logger.error("Error reading added device %s: %s", object_path, e)
+    
+    def _on_object_removed(self, manager, obj):
+        object_path = obj.get_object_path()
+        
+        # Only care about block devices, not jobs or other objects
+        if not object_path.startswith(BLOCK_DEVICES_PATH):
+            return
+            
+        logger.debug("UDisks2: Device removed: %s", object_path)
+        removed = False
+        for cache in self._cache.values():
+            if cache.pop(object_path, None) is not None:
+                removed = True
+        if removed:
+            self._notify_change()
     
-    def _on_properties_changed(self, manager, interface_proxy, changed_properties, invalidated_properties, *args):
-        object_path = interface_proxy.get_object_path()
+    def _on_properties_changed(self, manager, object_proxy, interface_proxy, changed_properties, invalidated_properties):
+        object_path = object_proxy.get_object_path()
         
         # Only care about block devices, not jobs or other objects
-        if not object_path.startswith('/org/freedesktop/UDisks2/block_devices/'):
+        if not object_path.startswith(BLOCK_DEVICES_PATH):
+            return
+            
+        # Only a handful of properties end up in the device info, ignore the rest
+        changed = changed_properties.unpack()
+        interface_name = interface_proxy.get_interface_name()
+        if interface_name == 'org.freedesktop.UDisks2.Filesystem':
+            relevant = 'MountPoints' in changed
+        elif interface_name == 'org.freedesktop.UDisks2.Block':
+            relevant = 'Device' in changed or not changed.keys().isdisjoint(_BLOCK_PROPERTY_KEYS)
+        else:
+            relevant = False
+        if not relevant:
+            return
+        
+        kind = None
+        for cache_kind, cache in self._cache.items():
+            if object_path in cache:
+                kind = cache_kind
+                break
+        
+        if kind is None and not _BLOCK_PATH_RE.fullmatch(f"/dev/{object_path[len(BLOCK_DEVICES_PATH):]}"):
+            # Loop, optical, device-mapper etc. objects are never listed
             return
+        
+        logger.debug("UDisks2: Properties changed on %s", object_path)
+        
+        try:
+            if kind is None:
+                # Not cached yet (e.g. the Block interface arrived late), read the whole object
+                if self._cache_object(object_proxy):
+                    self._notify_change()
+                return
             
-        print(f"UDisks2: Properties changed on {object_path}")
-        self._notify_change()
+            # Only update the fields that actually changed on this interface
+            updates = {}
+            if interface_name == 'org.freedesktop.UDisks2.Filesystem':
+                updates['mounted'], updates['mount_path'] = _get_mount_info(changed['MountPoints'])
+            else:
+                for prop, key in _BLOCK_PROPERTY_KEYS.items():
+                    if prop in changed:
+                        updates[key] = changed[prop]
+            
+            if updates:
+                # Replace rather than mutate so lists already handed to the callback stay unchanged
+                self._cache[kind][object_path] = {**self._cache[kind][object_path], **updates}
+                self._notify_change()
+        except Exception as e:
+            logger.error("Error updating device %s: %s", object_path, e)
     
     def _notify_change(self):
-        # Refresh device list and notify callback
+        # Coalesce bursts of signals (e.g. on hotplug) into a single callback
+        if self._pending_refresh:
+            return
+        self._pending_refresh = GLib.timeout_add(REFRESH_DELAY_MS, self._do_refresh)
+    
+    def _do_refresh(self):
+        # Notify callback with the cached device list
+        self._pending_refresh = 0
         if self.callback:
             try:
-                devices, partitions = udisks2_block_devices()
-                GLib.idle_add(self.callback, devices, partitions)
+                devices = list(self._cache['devices'].values())
+                partitions = list(self._cache['partitions'].values())
+                self.callback(devices, partitions)
             except Exception as e:
-                print(f"Error refreshing device list: {e}")
+                logger.error("Error refreshing device list: %s", e)
+        return GLib.SOURCE_REMOVE
     
     def stop(self):
         # Stop monitoring
+        if self._pending_refresh:
+            GLib.source_remove(self._pending_refresh)
+            self._pending_refresh = 0
         if self.manager:
             self.manager = None
         if self.bus:
             self.bus = None
-        print("UDisks2 monitor stopped")
-
+        logger.info("UDisks2 monitor stopped")
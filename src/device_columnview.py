@@ -19,10 +19,13 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 import os
-from gi.repository import GObject, Gtk
+import functools
+from gi.repository import GObject, Gio, Gtk
 
 from .partition_guids import PARTITION_TYPE_GUIDS
 
+_EXPLICIT_NOTIFY = GObject.ParamFlags.READWRITE | GObject.ParamFlags.EXPLICIT_NOTIFY
+
 class PartitionRow(GObject.Object):
     __gtype_name__ = 'PartitionRow'
 
@@ -36,10 +39,20 @@ class PartitionRow(GObject.Object):
         self._type = type
         self._mount_path = mount_path
 
-    @GObject.Property(type=bool, default=False)
+    # mounted and mount_path are the only fields that change after creation.
+    # They notify explicitly, and only when the value really changes, so
+    # rewriting an unchanged value doesn't rebind the cells.
+    @GObject.Property(type=bool, default=False, flags=_EXPLICIT_NOTIFY)
     def mounted(self):
         return self._mounted
 
+    @mounted.setter
+    def mounted(self, value):
+        if self._mounted == value:
+            return
+        self._mounted = value
+        self.notify('mounted')
+
     @GObject.Property(type=str)
     def path(self):
         return self._path
@@ -60,43 +73,147 @@ class PartitionRow(GObject.Object):
     def type(self):
         return self._type
 
-    @GObject.Property(type=str)
+    @GObject.Property(type=str, flags=_EXPLICIT_NOTIFY)
     def mount_path(self):
         return self._mount_path
 
+    @mount_path.setter
+    def mount_path(self, value):
+        if self._mount_path == value:
+            return
+        self._mount_path = value
+        self.notify('mount-path')
+
+class PartitionListModel(GObject.Object, Gio.ListModel):
+    # Columnview model backed by plain dicts. A PartitionRow is only built when
+    # GTK first asks for that position, and is then kept so the same object
+    # comes back for it (selection and in-place mount updates rely on that)
+    __gtype_name__ = 'PartitionListModel'
+
+    def __init__(self):
+        super().__init__()
+        self._records = []
+        self._rows = {}
+
+    def do_get_item_type(self):
+        return PartitionRow.__gtype__
+
+    def do_get_n_items(self):
+        return len(self._records)
+
+    def do_get_item(self, position):
+        if position >= len(self._records):
+            return None
+        row = self._rows.get(position)
+        if row is None:
+            record = self._records[position]
+            row = PartitionRow(
+                mounted=record['mounted'],
+                path=record['path'],
+                size=DeviceColumnViewManager._format_size(record['size']),
+                filesystem=record['filesystem'],
+                label=record['label'],
+                type=record['type'],
+                mount_path=record['mount_path']
+            )
+            self._rows[position] = row
+        return row
+
+    def replace(self, records):
+        # Copy the records so mount updates don't write into the caller's dicts
+        removed = len(self._records)
+        self._records = [dict(record) for record in records]
+        self._rows = {}
+        self.items_changed(0, removed, len(self._records))
+
+    def remove_all(self):
+        self.replace(())
+
+    def update_mount_status(self, partitions_by_path):
+        # Update the records, and any rows already built from them, in place
+        for position, record in enumerate(self._records):
+            partition = partitions_by_path.get(record['path'])
+            record['mounted'] = partition.get('mounted', False) if partition else False
+            record['mount_path'] = partition.get('mount_path') if partition else None
+            row = self._rows.get(position)
+            if row is not None:
+                # The setters skip the notify when nothing changed
+                row.mounted = record['mounted']
+                row.mount_path = record['mount_path']
+
+def disable_switch(switch):
+    # Switch off and grey out, only touching what isn't already in that state
+    # so no needless notify:: signals are emitted
+    if switch.get_active():
+        switch.set_active(False)
+    if switch.get_sensitive():
+        switch.set_sensitive(False)
+
+def _row_record(info, type, path=None, label=None):
+    # The dict a PartitionListModel row is built from
+    return {
+        'mounted': info.get('mounted', False),
+        'path': path if path is not None else info.get('path', ''),
+        'size': info.get('size', 0),
+        'filesystem': info.get('id_type', ''),
+        'label': label if label is not None else info.get('label', ''),
+        'type': type,
+        'mount_path': info.get('mount_path'),
+    }
+
 class DeviceColumnViewManager:
     def __init__(self, window, device_dropdown_manager):
         self.window = window
         self.device_dropdown_manager = device_dropdown_manager
+        self._saved_model = None
+        self._last_whole = (None, False)
+        self._last_populated_idx = None
+        # Swap the template's GListStore for a model that builds rows on demand
+        self.window.columnview_liststore = PartitionListModel()
+        self.window.columnview_model.set_model(self.window.columnview_liststore)
         self.setup_factories()
 
         self.window.columnview_model.connect('notify::selected', self.on_row_selected)
 
     def setup_factories(self):
         self.window.mounted_factory.connect("setup", self._mounted_factory_setup)
-        self.window.mounted_factory.connect("bind", self._mounted_factory_bind('mounted'))
+        self.window.mounted_factory.connect("bind", self._bind_mounted)
         self.window.device_path_factory.connect("setup", self._label_factory_setup)
-        self.window.device_path_factory.connect("bind", self._label_factory_bind('path'))
+        self.window.device_path_factory.connect("bind", self._bind_path)
         self.window.size_factory.connect("setup", self._label_factory_setup)
-        self.window.size_factory.connect("bind", self._label_factory_bind('size'))
+        self.window.size_factory.connect("bind", self._bind_size)
         self.window.filesystem_factory.connect("setup", self._label_factory_setup)
-        self.window.filesystem_factory.connect("bind", self._label_factory_bind('filesystem'))
+        self.window.filesystem_factory.connect("bind", self._bind_filesystem)
         self.window.label_factory.connect("setup", self._label_factory_setup)
-        self.window.label_factory.connect("bind", self._label_factory_bind('label'))
+        self.window.label_factory.connect("bind", self._bind_label)
         self.window.type_factory.connect("setup", self._label_factory_setup)
-        self.window.type_factory.connect("bind", self._label_factory_bind('type'))
+        self.window.type_factory.connect("bind", self._bind_type)
     
     def _label_factory_setup(self, factory, item):
         label = Gtk.Label()
         label.set_halign(Gtk.Align.START)
         item.set_child(label)
 
-    def _label_factory_bind(self, prop):
-        def bind_func(factory, item):
-            label = item.get_child()
-            row = item.get_item()
-            label.set_label(getattr(row, prop, ''))
-        return bind_func
+    # One bind callback per column, reading the row attribute directly
+    @staticmethod
+    def _bind_path(factory, item):
+        item.get_child().set_label(item.get_item().path or '')
+
+    @staticmethod
+    def _bind_size(factory, item):
+        item.get_child().set_label(item.get_item().size or '')
+
+    @staticmethod
+    def _bind_filesystem(factory, item):
+        item.get_child().set_label(item.get_item().filesystem or '')
+
+    @staticmethod
+    def _bind_label(factory, item):
+        item.get_child().set_label(item.get_item().label or '')
+
+    @staticmethod
+    def _bind_type(factory, item):
+        item.get_child().set_label(item.get_item().type or '')
     
     def _mounted_factory_setup(self, factory, item):
         check = Gtk.CheckButton()
@@ -104,21 +221,18 @@ class DeviceColumnViewManager:
         check.set_halign(Gtk.Align.CENTER)
         item.set_child(check)
 
-    def _mounted_factory_bind(self, prop):
-        def bind_func(factory, item):
-            check = item.get_child()
-            row = item.get_item()
-            # The mounted property is expected to be a bool
-            check.set_active(bool(getattr(row, prop, False)))
-            # Set mount path as tooltip
-            mount_path = getattr(row, 'mount_path', None)
-            if mount_path:
-                check.set_tooltip_text(mount_path)
-            else:
-                check.set_tooltip_text(None)
-        return bind_func
+    @staticmethod
+    def _bind_mounted(factory, item):
+        check = item.get_child()
+        row = item.get_item()
+        # The mounted property is expected to be a bool
+        check.set_active(bool(row.mounted))
+        # Set mount path as tooltip
+        check.set_tooltip_text(row.mount_path or None)
    
-    def _format_size(self, size_bytes):
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def _format_size(size_bytes):
         if not size_bytes:
             return "0 MB"
         size_mb = size_bytes / (1024 * 1024)
@@ -127,54 +241,55 @@ class DeviceColumnViewManager:
         else:
             return f"{size_mb:.2f} MB"
     
+    def _suspend_view(self):
+        # Detach the store from the selection model so the view doesn't track each change
+        self._saved_model = self.window.columnview_model.get_model()
+        self.window.columnview_model.set_model(None)
+
+    def _resume_view(self):
+        self.window.columnview_model.set_model(self._saved_model)
+        self._saved_model = None
+
+    def _replace_rows(self, records):
+        # Replace the whole list in one go so items-changed is only emitted once
+        self._last_populated_idx = None
+        self._suspend_view()
+        try:
+            self.window.columnview_liststore.replace(records)
+        finally:
+            self._resume_view()
+
+    @staticmethod
+    def build_device_records(device, partitions):
+        # Build the row records shown for a device: the whole device, then its partitions
+        records = [_row_record(device, 'WHOLE DEVICE', path=device['path'])]
+        for p in partitions:
+            part_type_guid = p.get('partition_type', '')
+            part_type_name = PARTITION_TYPE_GUIDS.get(part_type_guid, part_type_guid) if part_type_guid else ''
+            records.append(_row_record(p, part_type_name))
+        return tuple(records)
+
     def _populate_columnview(self, idx):
-        self.window.columnview_liststore.remove_all()
-        
-        if idx <= 0 or idx > len(self.device_dropdown_manager.devices):
+        if idx <= 0 or idx > len(self.device_dropdown_manager.device_entries):
+            self._last_populated_idx = None
+            self.window.columnview_liststore.remove_all()
             return
             
-        device = self.device_dropdown_manager.devices[idx - 1] # Get the list of devices from device manager but skip the placeholder 'select a device'
-        
-        # Find partitions for this device
-        matching_parts = [
-            p for p in self.device_dropdown_manager.partitions
-            if p['path'].startswith(device['path']) and p['path'] != device['path']
-        ]
+        # The records were built when the device list arrived, skipping the placeholder 'select a device'
+        records = self.device_dropdown_manager.device_entries[idx - 1].row_records
         
-        # Always show the whole device as a row
-        size_str = self._format_size(device.get('size', 0))
-        part_type_name = 'WHOLE DEVICE'
-        row = PartitionRow(
-            mounted=device.get('mounted', False),
-            path=device['path'],
-            size=size_str,
-            filesystem=device.get('id_type', ''),
-            label=device.get('label', ''),
-            type=part_type_name,
-            mount_path=device.get('mount_path')
-        )
-        self.window.columnview_liststore.append(row)
+        # Disable scan partitions switch if there are no partitions. The caller
+        # has just made it sensitive, so this applies even if the rows are unchanged
+        if len(records) == 1:
+            disable_switch(self.window.scan_partitions_switch)
         
-        # Then show all partitions (if any)
-        for p in matching_parts:
-            size_str = self._format_size(p.get('size', 0))
-            part_type_guid = p.get('partition_type', '')
-            part_type_name = PARTITION_TYPE_GUIDS.get(part_type_guid.lower(), part_type_guid) if part_type_guid else ''
-            row = PartitionRow(
-                mounted=p.get('mounted', False),
-                path=p.get('path', ''),
-                size=size_str,
-                filesystem=p.get('id_type', ''),
-                label=p.get('label', ''),
-                type=part_type_name,
-                mount_path=p.get('mount_path')
-            )
-            self.window.columnview_liststore.append(row)
+        # Nothing more to do if this device's rows are already showing. The store
+        # may have been cleared elsewhere in the meantime, so check it isn't empty
+        if idx == self._last_populated_idx and self.window.columnview_liststore.get_n_items():
+            return
         
-        # Disable scan partitions switch if there are no partitions
-        if not matching_parts:
-            self.window.scan_partitions_switch.set_sensitive(False)
-            self.window.scan_partitions_switch.set_active(False)
+        self._replace_rows(records)
+        self._last_populated_idx = idx
 
     def on_row_selected(self, selection, param):
         selected_index = self.window.columnview_model.get_selected()
@@ -187,19 +302,22 @@ class DeviceColumnViewManager:
                 # Enable scan_partitions_switch only if a whole device is selected AND has partitions
                 is_whole_device = (item.type == 'WHOLE DEVICE')
                 if is_whole_device:
-                    # Check if this device has any partitions
-                    matching_parts = [
-                        p for p in self.device_dropdown_manager.partitions
-                        if p['path'].startswith(item.path) and p['path'] != item.path
-                    ]
-                    has_partitions = len(matching_parts) > 0
+                    # Check if this device has any partitions, reusing the answer for a repeat selection
+                    last_path, has_partitions = self._last_whole
+                    if item.path != last_path:
+                        has_partitions = len(self.device_dropdown_manager.partitions_for_device(item.path)) > 0
+                        self._last_whole = (item.path, has_partitions)
                     self.window.scan_partitions_switch.set_sensitive(has_partitions)
                     if not has_partitions:
                         self.window.scan_partitions_switch.set_active(False)
                 else:
-                    self.window.scan_partitions_switch.set_sensitive(False)
-                    self.window.scan_partitions_switch.set_active(False)
+                    disable_switch(self.window.scan_partitions_switch)
     
+    def invalidate_cache(self):
+        # Called when the device/partition lists change
+        self._last_whole = (None, False)
+        self._last_populated_idx = None
+
     def refresh_device_liststore(self):
         # Refresh the columnview with updated device/partition data
         current_selection = self.window.select_device_dropdown.get_selected()
@@ -211,51 +329,17 @@ class DeviceColumnViewManager:
             self._populate_columnview(current_selection)
     
     def _refresh_mount_status(self):
-        # Update only the mounted status of existing entries without clearing the list
-        current_selected_index = self.window.columnview_model.get_selected()
-        current_selected_item = None
-        if current_selected_index != -1:
-            current_selected_item = self.window.columnview_liststore.get_item(current_selected_index)
-        
-        n_items = self.window.columnview_liststore.get_n_items()
-        
-        for i in range(n_items):
-            row = self.window.columnview_liststore.get_item(i)
-            if row:
-                device_path = row.path                
-                is_mounted = False
-                mount_path = None
-                
-                for partition in self.device_dropdown_manager.partitions:
-                    if partition['path'] == device_path:
-                        is_mounted = partition.get('mounted', False)
-                        mount_path = partition.get('mount_path')
-                        break
-                
-                # Update the row's mounted status
-                row.mounted = is_mounted
-                row.mount_path = mount_path
-        
-        # reselect the current selection
-        if current_selected_item is not None:
-            for i in range(n_items):
-                item = self.window.columnview_liststore.get_item(i)
-                if item and item.path == current_selected_item.path:
-                    self.window.columnview_model.set_selected(i)
-                    break
+        # Update only the mounted status of existing entries without clearing the list.
+        # Rows keep their positions, so the current selection is left as it is
+        self.window.columnview_liststore.update_mount_status(self.device_dropdown_manager.partitions_by_path)
 
     def update_columnview_for_image(self, image_path):
-        self.window.columnview_liststore.remove_all()
-        size_str = self._format_size(os.path.getsize(image_path) if os.path.exists(image_path) else 0)
-        row = PartitionRow(
-            mounted=False,
-            path=image_path,
-            size=size_str,
-            filesystem='',
-            label=os.path.basename(image_path),
-            type='IMAGE FILE'
-        )
-        self.window.columnview_liststore.append(row)
+        # A single stat gives both existence and size
+        try:
+            size = os.stat(image_path).st_size
+        except OSError:
+            size = 0
+        record = _row_record({'size': size}, 'IMAGE FILE', path=image_path, label=os.path.basename(image_path))
+        self._replace_rows([record])
         
-        self.window.save_image_switch.set_sensitive(False)
-        self.window.save_image_switch.set_active(False)
\ No newline at end of file
+        disable_switch(self.window.save_image_switch)
\ No newline at end of file
@@ -18,16 +18,36 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import logging
+from dataclasses import dataclass
+
 from gi.repository import Gtk
 
-from .block_devices import udisks2_block_devices, UDisks2Monitor
+from .block_devices import udisks2_block_devices, group_partitions_by_device, UDisks2Monitor
+from .device_columnview import DeviceColumnViewManager, disable_switch
+
+logger = logging.getLogger('DataRecovery')
+
+@dataclass(slots=True)
+class Device:
+    # A whole device with its dropdown label and columnview row records, built
+    # once per device list so selection doesn't redo any formatting or filtering
+    path: str
+    formatted_label: str
+    row_records: tuple
 
 class DeviceDropdownManager:
     # Manages device detection, selection, and monitoring
     def __init__(self, window):
         self.window = window
         self.devices = []
+        self.device_entries = []
         self.partitions = []
+        self.partitions_by_device = {}
+        self.partitions_by_path = {}
+        self._label_cache = {}
+        self._dropdown_entries = []  # (kind, payload) per row of device_liststore
+        self._dropdown_paths = {}  # Dropdown entry text -> position in device_liststore
         self.columnview_manager = None
         
         self.populate_device_selector()
@@ -36,68 +56,92 @@ class DeviceDropdownManager:
         self.window.select_device_dropdown.connect("notify::selected", self.on_device_selected)
     
     def populate_device_selector(self):
-        self.devices, self.partitions = udisks2_block_devices()
-        self.window.device_liststore.append(Gtk.StringObject.new("Select a device..."))
-        self.window.device_liststore.append(Gtk.StringObject.new("Select image file..."))
-        
-        for device in self.devices:
-            self.window.device_liststore.append(Gtk.StringObject.new(self._format_device_label(device)))
+        self._set_block_devices(*udisks2_block_devices())
+        self._replace_dropdown_items(self._build_dropdown_entries([]))
         
         self.window.select_device_dropdown.set_selected(0)
     
     def _repopulate_device_selector(self, devices=None, partitions=None):
         if devices is not None and partitions is not None:
-            print("Device list updated due to udisks2 changes")
-            self.devices = devices
-            self.partitions = partitions
+            logger.debug("Device list updated due to udisks2 changes")
+            self._set_block_devices(devices, partitions)
+            if self.columnview_manager:
+                self.columnview_manager.invalidate_cache()
 
+        # Read the current entries from the Python-side mirror of the store
+        # rather than fetching each item's string back out of GTK
         current_selection = self.window.select_device_dropdown.get_selected()
-        current_device = None
-        image_files = []
+        current_entry = None
+        if 2 <= current_selection < len(self._dropdown_entries):  # Skip first two items
+            current_entry = self._dropdown_entries[current_selection]
 
         # Collect any image files that were manually added
-        for i in range(2, self.window.device_liststore.get_n_items()):  # Skip first two items
-            item_text = self.window.device_liststore.get_item(i).get_string()
-            # If it's not a device path (doesn't start with /dev), it's likely an image file
-            if not item_text.startswith('/dev'):
-                image_files.append(item_text)
-            elif current_selection == i:
-                # Store currently selected device path for restoration
-                for device in self.devices:
-                    if self._format_device_label(device) == item_text:
-                        current_device = device['path']
-                        break
-
-        self.window.device_liststore.remove_all()
-        self.window.device_liststore.append(Gtk.StringObject.new("Select a device..."))
-        self.window.device_liststore.append(Gtk.StringObject.new("Select image file..."))
-
-        # Add devices
+        image_files = [payload for kind, payload in self._dropdown_entries if kind == 'image']
+
+        entries = self._build_dropdown_entries(image_files)
+
+        # Restore the previous device or image selection if it still exists
         new_selection = 0
-        for i, device in enumerate(self.devices):
-            self.window.device_liststore.append(Gtk.StringObject.new(self._format_device_label(device)))
-
-            # Restore previous device selection if it still exists
-            if current_device and device['path'] == current_device:
-                new_selection = i + 2
-
-        # Re-add any image files
-        for image_file in image_files:
-            self.window.device_liststore.append(Gtk.StringObject.new(image_file))
-            # If an image file was selected, restore that selection
-            if current_selection >= len(self.devices) + 2:
-                # Calculate if this was the selected image file
-                image_index = current_selection - len(self.devices) - 2
-                if image_index < len(image_files) and image_files[image_index] == image_file:
-                    new_selection = self.window.device_liststore.get_n_items() - 1
+        if current_entry is not None:
+            for i, (kind, payload, label) in enumerate(entries):
+                if (kind, payload) == current_entry:
+                    new_selection = i
+                    break
 
+        self._replace_dropdown_items(entries)
         self.window.select_device_dropdown.set_selected(new_selection)
 
         # Update the column view to reflect mount status changes
         if devices is not None and partitions is not None and self.columnview_manager:
             self.columnview_manager.refresh_device_liststore()
 
+    def _build_dropdown_entries(self, image_files):
+        # (kind, payload, label) for every dropdown row: the two fixed prompts,
+        # then the devices, then any image files the user added
+        entries = [('prompt', None, "Select a device..."), ('prompt', None, "Select image file...")]
+        entries.extend(('device', device.path, device.formatted_label) for device in self.device_entries)
+        entries.extend(('image', image_file, image_file) for image_file in image_files)
+        return entries
+
+    def _replace_dropdown_items(self, entries):
+        # Replace the whole list in one go so items-changed is only emitted once,
+        # with the store detached so the dropdown doesn't track the change
+        store = self.window.device_liststore
+        self.window.select_device_dropdown.set_model(None)
+        try:
+            store.splice(0, store.get_n_items(), [Gtk.StringObject.new(label) for kind, payload, label in entries])
+        finally:
+            self.window.select_device_dropdown.set_model(store)
+        self._dropdown_entries = [(kind, payload) for kind, payload, label in entries]
+        self._dropdown_paths = {label: i for i, (kind, payload, label) in enumerate(entries)}
+
+    def _set_block_devices(self, devices, partitions):
+        # Store the device lists along with the partition lookups built from them
+        # Labels survive refreshes; only drop those of devices that went away
+        present = {device['path'] for device in devices}
+        self._label_cache = {key: label for key, label in self._label_cache.items() if key[0] in present}
+        self.devices = devices
+        self.partitions = partitions
+        self.partitions_by_device = group_partitions_by_device(partitions)
+        self.partitions_by_path = {p['path']: p for p in partitions}
+        self.device_entries = [
+            Device(
+                path=device['path'],
+                formatted_label=self._format_device_label(device),
+                row_records=DeviceColumnViewManager.build_device_records(device, self.partitions_for_device(device['path'])),
+            )
+            for device in devices
+        ]
+
+    def partitions_for_device(self, device_path):
+        return self.partitions_by_device.get(device_path, ())
+
     def _format_device_label(self, device):
+        key = (device['path'], device.get('model'), device.get('serial'))
+        label = self._label_cache.get(key)
+        if label is not None:
+            return label
+        
         label = device['path']
         details = []
         if device.get('model'):
@@ -106,6 +150,7 @@ class DeviceDropdownManager:
             details.append(str(device['serial']))
         if details:
             label += " (" + " ".join(details) + ")"
+        self._label_cache[key] = label
         return label
     
     def on_device_selected(self, widget, param):
@@ -123,16 +168,15 @@ class DeviceDropdownManager:
             # If it doesn't start with /dev, it's likely an image file
             if not selected_text.startswith('/dev'):
                 self._handle_existing_image_selection(selected_text)
-            else:
-                self._handle_device_selection(selected)
+            elif selected - 2 < len(self.devices):
+                self._handle_device_selection(selected, self.devices[selected - 2])
         else:
             self._handle_no_selection()
     
     def _handle_image_file_selection(self):
         if hasattr(self.window, 'columnview_liststore'):
             self.window.columnview_liststore.remove_all()
-        self.window.scan_partitions_switch.set_sensitive(False)
-        self.window.scan_partitions_switch.set_active(False)
+        disable_switch(self.window.scan_partitions_switch)
         
         dialog = Gtk.FileDialog.new()
         dialog.set_modal(True)
@@ -146,7 +190,7 @@ class DeviceDropdownManager:
                     # Reset to "Select a device..." if no file was selected
                     self.window.select_device_dropdown.set_selected(0)
             except Exception as e:
-                print(f"FileDialog error: {e}")
+                logger.debug("FileDialog error: %s", e)
                 # Reset selection if file dialog failed
                 self.window.select_device_dropdown.set_selected(0)
         
@@ -154,17 +198,15 @@ class DeviceDropdownManager:
     
     def _handle_existing_image_selection(self, image_path):
         """Handle selection of an existing image file from the dropdown"""
-        self.window.scan_partitions_switch.set_sensitive(False)
-        self.window.scan_partitions_switch.set_active(False)
-        self.window.save_image_switch.set_sensitive(False)
-        self.window.save_image_switch.set_active(False)
+        disable_switch(self.window.scan_partitions_switch)
+        disable_switch(self.window.save_image_switch)
         
         # Update window state for selected image
         self.window.device_path = image_path
         if self.columnview_manager:
             self.columnview_manager.update_columnview_for_image(image_path)
     
-    def _handle_device_selection(self, selected):
+    def _handle_device_selection(self, selected, device):
         self.window.save_image_switch.set_sensitive(True)
         self.window.scan_partitions_switch.set_sensitive(True)
         
@@ -174,31 +216,30 @@ class DeviceDropdownManager:
             self.columnview_manager._populate_columnview(device_index)
             
             # Set the device_path for the selected device
-            actual_device_index = selected - 2  # 0-based index into devices array
-            if 0 <= actual_device_index < len(self.devices):
-                self.window.device_path = self.devices[actual_device_index]['path']
+            self.window.device_path = device['path']
     
     def _handle_no_selection(self):
         if hasattr(self.window, 'columnview_liststore'):
             self.window.columnview_liststore.remove_all()
 
-        self.window.scan_partitions_switch.set_sensitive(False)
-        self.window.scan_partitions_switch.set_active(False)
+        disable_switch(self.window.scan_partitions_switch)
         self.window.save_image_switch.set_sensitive(True)
     
     def _add_image_to_selector(self, path):
         # Check if image is already in the list
-        for i in range(self.window.device_liststore.get_n_items()):
-            if self.window.device_liststore.get_item(i).get_string() == path:
-                self.window.select_device_dropdown.set_selected(i)
-                # Update window state for selected image
-                self.window.device_path = path
-                if self.columnview_manager:
-                    self.columnview_manager.update_columnview_for_image(path)
-                return
+        idx = self._dropdown_paths.get(path)
+        if idx is not None:
+            self.window.select_device_dropdown.set_selected(idx)
+            # Update window state for selected image
+            self.window.device_path = path
+            if self.columnview_manager:
+                self.columnview_manager.update_columnview_for_image(path)
+            return
 
+        self._dropdown_paths[path] = self.window.device_liststore.get_n_items()
+        self._dropdown_entries.append(('image', path))
         self.window.device_liststore.append(Gtk.StringObject.new(path))
-        self.window.select_device_dropdown.set_selected(self.window.device_liststore.get_n_items() - 1)
+        self.window.select_device_dropdown.set_selected(self._dropdown_paths[path])
 
         # Update window state for selected image
         self.window.device_path = path
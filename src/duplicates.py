@@ -22,11 +22,31 @@ import subprocess
 import logging
 import os
 import traceback
+import tempfile
 import time
 from .preflight import check_tools_exist
 
 logger = logging.getLogger('DataRecovery')
 
+# How long to block on rdfind before re-checking cancellation (seconds)
+RDFIND_POLL_INTERVAL = 0.2
+
+
+def _stop_process(process, grace=2.0, poll=0.05):
+    # Send SIGTERM once, then wait in short steps and escalate to SIGKILL
+    # if the process is still running once the grace period is over
+    process.terminate()
+    deadline = time.monotonic() + grace
+    while time.monotonic() < deadline:
+        try:
+            process.wait(timeout=poll)
+            return
+        except subprocess.TimeoutExpired:
+            pass
+    logger.warning("rdfind didn't terminate gracefully, killing it")
+    process.kill()
+    process.wait()
+
 
 def remove_duplicates_with_rdfind(recovery_dir, controller=None):
     try:
@@ -45,39 +65,39 @@ def remove_duplicates_with_rdfind(recovery_dir, controller=None):
 
         logger.info("Running rdfind to remove duplicates...")
         
-        # Use Popen so we can check for cancellation
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        # rdfind's stdout is never used; stderr goes to an unlinked temp file
+        # rather than a pipe, so a verbose run can't fill the buffer and block
+        with tempfile.TemporaryFile() as stderr_file:
+            # Use Popen so we can check for cancellation
+            process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=stderr_file)
         
-        # Poll the process and check for cancellation
-        start_time = time.time()
-        while process.poll() is None:
-            if controller and controller.cancel_requested:
-                logger.info("Cancellation requested, terminating rdfind duplicate removal")
-                process.terminate()
+            # Block on the process with a short timeout so exit is noticed straight
+            # away, checking for cancellation and the deadline in between
+            deadline = time.time() + timeout
+            cancel_requested = controller.cancel_event.is_set if controller else lambda: False
+            while True:
                 try:
-                    process.wait(timeout=5)
+                    process.wait(timeout=RDFIND_POLL_INTERVAL)
+                    break
                 except subprocess.TimeoutExpired:
-                    logger.warning("rdfind didn't terminate gracefully, killing it")
-                    process.kill()
-                    process.wait()
-                logger.info("Duplicate removal cancelled")
-                return
+                    pass
+
+                if cancel_requested():
+                    logger.info("Cancellation requested, terminating rdfind duplicate removal")
+                    _stop_process(process)
+                    logger.info("Duplicate removal cancelled")
+                    return
             
-            # Check timeout
-            if time.time() - start_time > timeout:
-                logger.error(f"rdfind timed out after {timeout} seconds")
-                process.terminate()
-                try:
-                    process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    process.kill()
-                    process.wait()
-                return
-                
-            time.sleep(1)
+                # Check timeout
+                if time.time() > deadline:
+                    logger.error(f"rdfind timed out after {timeout} seconds")
+                    _stop_process(process)
+                    return
         
-        # Get the results
-        stdout, stderr = process.communicate()
+            # Get the results
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode('utf-8', 'replace').strip()
+
         result_returncode = process.returncode
 
         if result_returncode == 0:
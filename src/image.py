@@ -39,16 +39,21 @@ def pkexec_ddrescue(device_path, dest_path, partition_paths=None, partitions_dat
         owner_gid = os.getgid()
 
         validated_parts, skipped = validate_partition_paths(partition_paths or [])
-        for p in skipped:
-            logger.warning(f"Partition/image path not valid, skipping: {p}")
+        if skipped:
+            logger.warning(f"Partition/image paths not valid, skipping: {', '.join(skipped)}")
 
-        return _create_and_run_helper(device_path, dest_path, validated_parts, owner_uid, owner_gid, controller)
+        # Allow direct (O_DIRECT) reads for every ddrescue pass to be enabled via env var
+        direct_io = os.environ.get('DATARECOVERY_DIRECT_IO', '0') == '1'
+        if direct_io:
+            logger.info("Direct I/O enabled for all ddrescue passes")
+
+        return _create_and_run_helper(device_path, dest_path, validated_parts, owner_uid, owner_gid, controller, direct_io)
     except Exception as e:
         logger.error(f"pkexec with ddrescue failed: {e}")
         return False
 
-def _create_and_run_helper(device_path, dest_path, partition_paths, owner_uid, owner_gid, controller=None):
+def _create_and_run_helper(device_path, dest_path, partition_paths, owner_uid, owner_gid, controller=None, direct_io=False):
     """Create and run ddrescue helper using the DDRescueHelper class"""
-    helper = DDRescueHelper(device_path, dest_path, partition_paths, owner_uid, owner_gid)
+    helper = DDRescueHelper(device_path, dest_path, partition_paths, owner_uid, owner_gid, direct_io)
     return helper.run_with_pkexec(controller)
 
@@ -19,116 +19,204 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 import os
+import sys
 import subprocess
 import tempfile
+import threading
 import logging
+import py_compile
+import functools
 from gi.repository import GLib
 
 logger = logging.getLogger('DataRecovery')
 
+# Seconds between cancellation checks while waiting for the helper to exit
+CANCEL_POLL_INTERVAL = 0.2
 
-class DDRescueHelper:
-    """Manages ddrescue execution through a secure helper script via pkexec"""
-    
-    def __init__(self, device_path, dest_path, partition_paths, owner_uid, owner_gid):
-        self.device_path = device_path
-        self.dest_path = dest_path
-        self.partition_paths = partition_paths or []
-        self.owner_uid = owner_uid
-        self.owner_gid = owner_gid
-        
-        # Temporary file paths
-        self.helper_path = None
-        self.cancel_file_path = None
-        self.helper_fd = None
-        
-        # Cache directory for secure temp files
-        self.cache_dir = os.path.join(GLib.get_user_cache_dir(), 'datarecovery')
-        os.makedirs(self.cache_dir, exist_ok=True, mode=0o700)
-    
-    def create_helper_script(self):
-        """Generate the Python helper script for ddrescue execution"""
-        helper_template = '''#!/usr/bin/env python3
+# Interpreter pkexec runs the helper with
+HELPER_PYTHON = '/usr/bin/python3'
+
+# File in the working directory that collects the helper's and ddrescue's output
+DDRESCUE_LOG_NAME = 'ddrescue.log'
+
+# Bytes moved per splice() call when copying helper output to the log
+OUTPUT_CHUNK_SIZE = 1 << 20
+
+
+def _copy_output(src_fd, dst_fd):
+    """Copy src_fd to dst_fd until EOF, inside the kernel with splice() where possible"""
+    splice = getattr(os, 'splice', None)
+    try:
+        while True:
+            if splice is not None:
+                try:
+                    n = splice(src_fd, dst_fd, OUTPUT_CHUNK_SIZE, flags=os.SPLICE_F_MOVE | os.SPLICE_F_MORE)
+                except OSError:
+                    # Not every filesystem supports splice(), copy through userspace instead
+                    splice = None
+                    continue
+            else:
+                data = os.read(src_fd, 65536)
+                n = len(data)
+                if n:
+                    os.write(dst_fd, data)
+            if n == 0:
+                break
+    except OSError as e:
+        logger.warning('Failed to copy ddrescue output to log: %s', e)
+    finally:
+        os.close(src_fd)
+        os.close(dst_fd)
+
+# The privileged helper run through pkexec, encoded once at import
+_HELPER_SCRIPT = '''#!/usr/bin/env python3
 import os
 import sys
 import argparse
 import subprocess
+import select
+import shutil
 import signal
 import time
 import tempfile
 
-current_process = None
-cancel_file = None  # Will be set to secure location in main()
+MAX_PARALLEL_PARTITIONS = 4
+MIN_WAIT_INTERVAL = 0.1
+MAX_WAIT_INTERVAL = 1.0
+
+current_processes = []
+cancel_fd = None  # Parent's cancel eventfd (or pipe read end), set in main()
+
+def _log(msg, fd=2):
+    """Write one line straight to stderr (or stdout) with a single write call"""
+    os.write(fd, (msg + '\\n').encode('utf-8', 'replace'))
+
+def wait_for_cancel(timeout):
+    """Wait up to timeout seconds for the parent to request cancellation"""
+    if cancel_fd is None:
+        time.sleep(timeout)
+        return False
+    readable, _, _ = select.select([cancel_fd], [], [], timeout)
+    return bool(readable)
 
 def check_cancel():
     """Check if cancellation was requested"""
-    return os.path.exists(cancel_file.format(pid=os.getpid()))
+    return wait_for_cancel(0)
 
-def signal_handler(signum, frame):
-    global current_process
-    print(f'Received signal {signum}, terminating...', file=sys.stderr)
-    if current_process and current_process.poll() is None:
-        print('Terminating ddrescue process...', file=sys.stderr)
-        current_process.terminate()
+def wait_for_event(processes, fallback_timeout):
+    """Block until one of the processes exits or cancellation is requested, True on cancel"""
+    # Each child gets a pidfd, which polls readable once it exits, so nothing
+    # wakes up until there is something to do
+    pidfds = []
+    try:
+        for process in processes:
+            pidfds.append(os.pidfd_open(process.pid))
+    except (AttributeError, OSError):
+        # No pidfd support (Python < 3.9 or kernel < 5.3), wait for at most
+        # fallback_timeout instead, blocking on the process itself when there
+        # is only one and no cancel fd to watch
+        for fd in pidfds:
+            os.close(fd)
+        if cancel_fd is None and len(processes) == 1:
+            try:
+                processes[0].wait(timeout=fallback_timeout)
+            except subprocess.TimeoutExpired:
+                pass
+            return False
+        return wait_for_cancel(fallback_timeout)
+    
+    try:
+        poller = select.poll()
+        for fd in pidfds:
+            poller.register(fd, select.POLLIN)
+        if cancel_fd is not None:
+            poller.register(cancel_fd, select.POLLIN)
+        events = poller.poll()
+    finally:
+        for fd in pidfds:
+            os.close(fd)
+    return any(fd == cancel_fd for fd, _ in events)
+
+def stop_processes():
+    """Terminate any running ddrescue processes, killing them if they don't exit"""
+    for process in current_processes:
+        if process.poll() is None:
+            _log('Terminating ddrescue process...')
+            process.terminate()
+    for process in current_processes:
         try:
-            current_process.wait(timeout=5)
+            process.wait(timeout=5)
         except subprocess.TimeoutExpired:
-            print('Force killing ddrescue process...', file=sys.stderr)
-            current_process.kill()
-            current_process.wait()
+            _log('Force killing ddrescue process...')
+            process.kill()
+            process.wait()
+
+def signal_handler(signum, frame):
+    _log(f'Received signal {signum}, terminating...')
+    stop_processes()
     sys.exit(1)
 
+def is_rotational(dev):
+    """Check whether a block device is a spinning disk, assume it is if unknown"""
+    try:
+        with open(f'/sys/block/{os.path.basename(dev)}/queue/rotational') as f:
+            return f.read().strip() != '0'
+    except OSError:
+        return True
+
 def run(cmd):
-    global current_process
-    print('RUN:', ' '.join(cmd))
+    run_all([cmd])
+
+def run_all(cmds, max_parallel=1):
+    """Run commands with up to max_parallel at once, exiting on cancellation or failure"""
+    pending = list(cmds)
+    failed = None
     
     # Check for cancellation before starting
     if check_cancel():
-        print('Cancellation requested before ddrescue execution, stopping', file=sys.stderr)
+        _log('Cancellation requested before ddrescue execution, stopping')
         sys.exit(1)
     
-    current_process = subprocess.Popen(cmd)
+    # Timeout for the no-pidfd fallback, backing off from 100 ms to 1 s while
+    # nothing happens and reset whenever a process finishes
+    delay = MIN_WAIT_INTERVAL
     
-    # Poll the process and check for cancellation
-    while current_process.poll() is None:
-        time.sleep(1)
-        if check_cancel():
-            print('Cancellation requested during ddrescue execution, terminating...', file=sys.stderr)
-            current_process.terminate()
-            try:
-                current_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                print('Force killing ddrescue process...', file=sys.stderr)
-                current_process.kill()
-                current_process.wait()
-            print('ddrescue imaging cancelled', file=sys.stderr)
+    while pending or current_processes:
+        while pending and len(current_processes) < max_parallel:
+            cmd = pending.pop(0)
+            _log('RUN: ' + ' '.join(cmd), 1)
+            # No extra fds need closing (the helper's own are close-on-exec), so
+            # with an absolute program path Popen can use posix_spawn rather than fork
+            process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, close_fds=False)
+            current_processes.append(process)
+        
+        # Wait for a process to finish or for cancellation
+        if wait_for_event(current_processes, delay):
+            _log('Cancellation requested during ddrescue execution, terminating...')
+            stop_processes()
+            _log('ddrescue imaging cancelled')
             sys.exit(1)
+        
+        delay = min(delay * 1.5, MAX_WAIT_INTERVAL)
+        for process in list(current_processes):
+            if process.poll() is not None:
+                delay = MIN_WAIT_INTERVAL
+                current_processes.remove(process)
+                if process.returncode != 0:
+                    _log('Command failed: ' + ' '.join(process.args))
+                    failed = process.returncode
+                    pending = []
     
-    returncode = current_process.returncode
-    current_process = None
-    
-    if returncode != 0:
-        print('Command failed:', ' '.join(cmd), file=sys.stderr)
-        sys.exit(returncode)
+    if failed is not None:
+        sys.exit(failed)
 
 def main():
-    global cancel_file, pid_file_path
+    global cancel_fd, pid_file_path
     
     # Set up signal handlers
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
     
-    # Create secure cancel file in user's runtime directory
-    runtime_dir = os.environ.get('XDG_RUNTIME_DIR', '/tmp')
-    cancel_fd, cancel_file = tempfile.mkstemp(
-        dir=runtime_dir,
-        prefix='datarecovery_cancel_',
-        suffix='.flag'
-    )
-    os.fchmod(cancel_fd, 0o600)  # Set secure permissions
-    os.close(cancel_fd)  # We just need the filename, close the descriptor
-    os.remove(cancel_file)  # Remove the file, we'll create it when cancellation is requested
-    
     # Write our PID to a secure file so the parent can signal us
     pid_file_path = None
     try:
@@ -143,7 +231,6 @@ def main():
         with os.fdopen(pid_file_fd, 'w') as f:
             f.write(str(os.getpid()))
             f.flush()
-            os.fsync(f.fileno())
     except:
         pass  # Continue even if we can't write PID file
     
@@ -153,20 +240,26 @@ def main():
     p.add_argument('--partitions', nargs='*', default=[]) 
     p.add_argument('--owner-uid', type=int, required=True)
     p.add_argument('--owner-gid', type=int, required=True)
-    p.add_argument('--cancel-file', required=True)
+    p.add_argument('--direct-io', action='store_true')
+    p.add_argument('--cancel-fd', type=int, default=None)
     args = p.parse_args()
     
-    # Use the cancel file path provided by parent
-    cancel_file = args.cancel_file
+    # The parent writes to (or closes) this fd to request cancellation
+    cancel_fd = args.cancel_fd
 
-    dd = 'ddrescue'
+    # Resolve ddrescue once; an absolute path is also needed for Popen's posix_spawn path
+    dd = shutil.which('ddrescue') or 'ddrescue'
     dev = args.device
-    dest = args.dest
-    img = os.path.join(dest, os.path.basename(dev) + '.img')
-    mapf = os.path.join(dest, os.path.basename(dev) + '.map')
+    dest = args.dest.rstrip('/')  # The app always passes a plain directory path
+    base = os.path.basename(dev)
+    img = f'{dest}/{base}.img'
+    mapf = f'{dest}/{base}.map'
+
+    # Optionally bypass the page cache on the first pass as well as the retry passes
+    first_pass = [dd, '--force', '--idirect'] if args.direct_io else [dd, '--force']
 
     stages = [
-        [dd, '--force', '--no-scrape', '--verbose', dev, img, mapf],
+        first_pass + ['--no-scrape', '--verbose', dev, img, mapf],
         [dd, '--force', '--idirect', '--retry-passes=3', '--no-scrape', '--verbose', dev, img, mapf],
         [dd, '--force', '--idirect', '--retry-passes=3', '--reverse', '--verbose', dev, img, mapf],
         [dd, '--force', '--idirect', '--retry-passes=3', '--verbose', dev, img, mapf],
@@ -175,7 +268,7 @@ def main():
     try:
         for cmd in stages:
             if check_cancel():
-                print('Cancellation requested before ddrescue stage, stopping', file=sys.stderr)
+                _log('Cancellation requested before ddrescue stage, stopping')
                 sys.exit(1)
                 
             run(cmd)
@@ -183,39 +276,78 @@ def main():
                 os.chown(img, args.owner_uid, args.owner_gid)
                 os.chown(mapf, args.owner_uid, args.owner_gid)
             except Exception as e:
-                print('chown failed:', e, file=sys.stderr)
+                _log(f'chown failed: {e}')
 
-        # Partition imaging
+        # Partition imaging, in parallel when the disk has no seek penalty
+        if check_cancel():
+            _log('Cancellation requested before partition imaging, stopping')
+            sys.exit(1)
+        
+        partition_files = []
+        partition_cmds = []
         for ppath in args.partitions:
-            if check_cancel():
-                print('Cancellation requested before partition imaging, stopping', file=sys.stderr)
-                sys.exit(1)
-                
-            pimg = os.path.join(dest, os.path.basename(ppath) + '.img')
-            pmap = os.path.join(dest, os.path.basename(ppath) + '.map')
-            run([dd, '--force', '--verbose', ppath, pimg, pmap])
-            try:
-                os.chown(pimg, args.owner_uid, args.owner_gid)
-                os.chown(pmap, args.owner_uid, args.owner_gid)
-            except Exception:
-                pass
+            pbase = os.path.basename(ppath)
+            pimg = f'{dest}/{pbase}.img'
+            pmap = f'{dest}/{pbase}.map'
+            partition_files.extend([pimg, pmap])
+            partition_cmds.append(first_pass + ['--verbose', ppath, pimg, pmap])
+        
+        max_parallel = 1 if is_rotational(dev) else min(MAX_PARALLEL_PARTITIONS, len(partition_cmds))
+        try:
+            if partition_cmds:
+                run_all(partition_cmds, max_parallel)
+        finally:
+            for path in partition_files:
+                try:
+                    os.chown(path, args.owner_uid, args.owner_gid)
+                except Exception:
+                    pass
     finally:
         # Clean up files
-        try:
-            if pid_file_path and os.path.exists(pid_file_path):
-                os.remove(pid_file_path)
-            if os.path.exists(cancel_file):
-                os.remove(cancel_file)
-        except:
-            pass
+        if pid_file_path:
+            try:
+                os.unlink(pid_file_path)
+            except OSError:
+                pass
 
 if __name__ == '__main__':
     main()
-'''
-        return helper_template
+'''.encode('utf-8')
+
+
+@functools.lru_cache(maxsize=1)
+def _cache_dir():
+    """Return the cache directory for helper files, creating it on first use only"""
+    path = os.path.join(GLib.get_user_cache_dir(), 'datarecovery')
+    os.makedirs(path, exist_ok=True, mode=0o700)
+    return path
+
+
+class DDRescueHelper:
+    """Manages ddrescue execution through a secure helper script via pkexec"""
+    
+    def __init__(self, device_path, dest_path, partition_paths, owner_uid, owner_gid, direct_io=False):
+        self.device_path = device_path
+        self.dest_path = dest_path
+        self.partition_paths = partition_paths or []
+        self.owner_uid = owner_uid
+        self.owner_gid = owner_gid
+        self.direct_io = direct_io
+        
+        # Temporary file paths
+        self.helper_path = None
+        self.helper_fd = None
+        self.compiled_path = None
+        
+        # Cache directory for secure temp files
+        self.cache_dir = _cache_dir()
+    
+    def create_helper_script(self):
+        """Return the Python helper script for ddrescue execution"""
+        return _HELPER_SCRIPT
     
     def create_secure_temp_files(self):
-        """Create secure temporary files for the helper script and cancellation"""
+        """Create secure temporary files for the helper script"""
         try:
             # Create helper script file
             self.helper_fd, self.helper_path = tempfile.mkstemp(
@@ -228,25 +360,19 @@ if __name__ == '__main__':
             os.fchmod(self.helper_fd, 0o600)
             
             # Write the helper script
-            with os.fdopen(self.helper_fd, 'w') as tf:
-                tf.write(self.create_helper_script())
-                tf.flush()
-                os.fsync(tf.fileno())  # Ensure data is written to disk
-            self.helper_fd = None  # File descriptor is closed by fdopen context manager
+            os.write(self.helper_fd, self.create_helper_script())
+            os.close(self.helper_fd)
+            self.helper_fd = None
 
             # Make executable by owner only
             os.chmod(self.helper_path, 0o700)
-
-            # Create secure cancel file for communication with helper
-            runtime_dir = os.environ.get('XDG_RUNTIME_DIR', self.cache_dir)
-            cancel_fd, self.cancel_file_path = tempfile.mkstemp(
-                dir=runtime_dir,
-                prefix='datarecovery_cancel_',
-                suffix='.flag'
-            )
-            os.fchmod(cancel_fd, 0o600)  # Set secure permissions
-            os.close(cancel_fd)  # We just need the filename
-            os.remove(self.cancel_file_path)  # Remove the file initially
+            
+            # Precompile so the helper isn't parsed again under pkexec. The .pyc is
+            # only usable when we are running the same interpreter that pkexec will
+            if os.path.realpath(sys.executable) == os.path.realpath(HELPER_PYTHON):
+                compiled_path = self.helper_path + 'c'
+                if py_compile.compile(self.helper_path, cfile=compiled_path, doraise=False):
+                    self.compiled_path = compiled_path
             
             return True
             
@@ -261,33 +387,57 @@ if __name__ == '__main__':
             return False
             
         try:
-            # Build command arguments
-            cmd = [
-                "pkexec", "/usr/bin/python3", self.helper_path, 
+            # pkexec only passes stdin/stdout/stderr through to the helper, so the
+            # controller's cancel eventfd (or pipe read end) is handed over as stdin
+            cancel_fd = getattr(controller, 'cancel_read_fd', None)
+            
+            # Build the command in one go. All partitions follow a single --partitions,
+            # since the helper's nargs='*' keeps only the last of repeated flags
+            # -I ignores PYTHON* variables and user site-packages, -B writes no bytecode
+            cmd = (
+                "pkexec", HELPER_PYTHON, "-I", "-B", self.compiled_path or self.helper_path, 
                 '--device', self.device_path, 
                 '--dest', self.dest_path,
                 '--owner-uid', str(self.owner_uid), 
-                '--owner-gid', str(self.owner_gid), 
-                '--cancel-file', self.cancel_file_path
-            ]
-            
-            # Add partitions
-            for p in self.partition_paths:
-                cmd.extend(['--partitions', p])
+                '--owner-gid', str(self.owner_gid),
+                *(('--direct-io',) if self.direct_io else ()),
+                *(('--cancel-fd', '0') if cancel_fd is not None else ()),
+                *(('--partitions', *self.partition_paths) if self.partition_paths else ()),
+            )
 
             logger.info('Running ddrescue helper via pkexec')
             
+            # Send the helper's output, including ddrescue's, through a pipe into the log file
+            output_fd, output_thread = self._start_output_log()
+            
             # Use Popen so we can store process reference for cancellation
-            process = subprocess.Popen(cmd)
+            try:
+                process = subprocess.Popen(cmd, stdin=cancel_fd, stdout=output_fd, stderr=output_fd)
+            finally:
+                os.close(output_fd)  # The helper holds its own copy
             if controller:
                 controller.current_process = process
-                controller.cancel_file_path = self.cancel_file_path  # Store for cancellation
                 
-            # Wait for completion
-            result_code = process.wait()
+            # Wait for completion, terminating the helper if cancellation is requested
+            terminated = False
+            while True:
+                try:
+                    result_code = process.wait(timeout=CANCEL_POLL_INTERVAL)
+                    break
+                except subprocess.TimeoutExpired:
+                    if controller and controller.cancel_requested and not terminated:
+                        logger.info('Cancellation requested, terminating ddrescue helper')
+                        terminated = True
+                        try:
+                            process.terminate()
+                        except (PermissionError, ProcessLookupError):
+                            # pkexec runs as root by now; the cancel fd stops the helper
+                            # and we keep waiting for it to exit
+                            pass
             
             if controller:
                 controller.current_process = None  # Clear reference when done
+            output_thread.join(timeout=5)
                 
             if result_code == 0:
                 logger.info('ddrescue helper completed successfully')
@@ -302,6 +452,17 @@ if __name__ == '__main__':
         finally:
             self.cleanup()
     
+    def _start_output_log(self):
+        """Open a pipe drained into the ddrescue log by a thread, return the write end and the thread"""
+        # No O_APPEND: splice() refuses to write to append-mode files
+        log_fd = os.open(os.path.join(self.dest_path, DDRESCUE_LOG_NAME),
+                         os.O_WRONLY | os.O_CREAT | os.O_CLOEXEC, 0o600)
+        os.lseek(log_fd, 0, os.SEEK_END)
+        read_fd, write_fd = os.pipe2(os.O_CLOEXEC)
+        thread = threading.Thread(target=_copy_output, args=(read_fd, log_fd), daemon=True)
+        thread.start()
+        return write_fd, thread
+    
     def cleanup(self):
         """Clean up temporary files and resources"""
         # Clean up file descriptor if still open
@@ -312,22 +473,18 @@ if __name__ == '__main__':
                 pass
             self.helper_fd = None
         
-        # Clean up temporary helper script
-        if self.helper_path and os.path.exists(self.helper_path):
+        # Clean up the temporary helper script and its bytecode, a single unlink
+        # each with no exists() check first
+        for attr in ('compiled_path', 'helper_path'):
+            path = getattr(self, attr)
+            if not path:
+                continue
             try:
-                # Securely remove the file
-                os.chmod(self.helper_path, 0o600)  # Ensure we can delete it
-                os.remove(self.helper_path)
-                logger.debug(f"Cleaned up helper script: {self.helper_path}")
+                os.unlink(path)
+                logger.debug(f"Cleaned up helper script: {path}")
+            except FileNotFoundError:
+                pass
             except Exception as e:
                 logger.warning(f"Failed to clean up helper script: {e}")
-            self.helper_path = None
-        
-        # Clean up cancel file
-        if self.cancel_file_path and os.path.exists(self.cancel_file_path):
-            try:
-                os.remove(self.cancel_file_path)
-                logger.debug(f"Cleaned up cancel file: {self.cancel_file_path}")
-            except Exception as e:
-                logger.warning(f"Failed to clean up cancel file: {e}")
-            self.cancel_file_path = None
+            finally:
+                setattr(self, attr, None)
@@ -18,27 +18,116 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
+
+# The log file is flushed after this many records or seconds, whichever comes first
+FLUSH_RECORDS = 100
+FLUSH_INTERVAL = 0.5
+
+# Listener writing queued records out to the real handlers, replaced on each setup
+_queue_listener = None
+
 
 class WorkingDirectoryFileHandler(logging.FileHandler):
+    # Buffers writes and flushes in batches instead of after every record. A
+    # timer makes sure a quiet period never leaves records sitting in the buffer
     def __init__(self, working_dir):
         log_path = os.path.join(working_dir, "DataRecovery.log")
-        super().__init__(log_path, mode='a', encoding='utf-8')
+        super().__init__(log_path, mode='a', encoding='utf-8', delay=True)
+        self._in_emit = False
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._flush_timer = None
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=65536, encoding=self.encoding, errors=self.errors)
+
+    def emit(self, record):
+        self._in_emit = True
+        try:
+            super().emit(record)
+        except OSError:
+            # FileHandler opens the file outside its own error handling; the
+            # working directory may be gone by now. Report it, don't kill the listener
+            self.handleError(record)
+        finally:
+            self._in_emit = False
+
+    def flush(self):
+        # StreamHandler.emit() flushes after each record; only honour that once
+        # a batch is full or old enough. Any other caller gets a real flush
+        if self._in_emit:
+            self._pending += 1
+            if self._pending < FLUSH_RECORDS and time.monotonic() - self._last_flush < FLUSH_INTERVAL:
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(FLUSH_INTERVAL, self._flush_now)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+        self._flush_now()
+
+    def _flush_now(self):
+        with self.lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._pending = 0
+            self._last_flush = time.monotonic()
+            super().flush()
+
+
+def _stop_queue_listener():
+    global _queue_listener
+    if _queue_listener is None:
+        return
+    _queue_listener.stop()
+    for handler in _queue_listener.handlers:
+        handler.close()
+    _queue_listener = None
+
+
+def flush_datarecovery_logging():
+    # Write out every queued and buffered record, e.g. before DataRecovery.log
+    # is moved. The file stays open, so later records follow the moved file
+    if _queue_listener is None:
+        return
+    # Stopping the listener processes everything already queued
+    _queue_listener.stop()
+    try:
+        for handler in _queue_listener.handlers:
+            handler.flush()
+    finally:
+        _queue_listener.start()
 
 
 def setup_datarecovery_logging(working_dir):
+    global _queue_listener
     logger = logging.getLogger('DataRecovery')
     logger.setLevel(logging.INFO)
 
     logger.handlers = []
+    _stop_queue_listener()
 
     file_handler = WorkingDirectoryFileHandler(working_dir)
     formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s', datefmt='%H:%M:%S')
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
 
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+
+    # Callers only enqueue records, a background thread does the formatting and I/O
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _queue_listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler)
+    _queue_listener.start()
     return logger
+
+
+# Drain the queue before logging.shutdown() flushes and closes the handlers
+atexit.register(_stop_queue_listener)
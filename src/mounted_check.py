@@ -18,40 +18,91 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import os
+import re
 import subprocess
-from gi.repository import Adw, GLib
+import threading
+from dataclasses import dataclass
+from gi.repository import Adw, Gio, GLib
+
+UDISKS2_BLOCK_DEVICES_PATH = '/org/freedesktop/UDisks2/block_devices/'
+
+# mountinfo escapes space, tab, newline and backslash as \ooo octal
+_MOUNTINFO_ESCAPE_RE = re.compile(r'\\([0-7]{3})')
+
+@dataclass(slots=True, frozen=True)
+class _DialogCtx:
+    # State the unmount dialog response handler needs
+    mounted_partitions: tuple
+    device_path: str
+    dest: str
+    success_callback: object
 
 class MountedPartitionChecker:
+    # Mount points that must never be unmounted from under the running system
+    _CRITICAL_MOUNTS = frozenset(('/', '/home', '/boot', '/usr', '/var', '/tmp', '/opt'))
+
     def __init__(self, parent_window, block_devices, logger=None):
         self.parent_window = parent_window
         self.block_devices = block_devices
         self.logger = logger
+        self._bus = None
     
+    @staticmethod
+    def load_mounts():
+        # Map each mounted source device to its first mount point, from a single
+        # read of the kernel's mount table
+        mounts = {}
+        try:
+            with open('/proc/self/mountinfo') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return mounts
+        for line in lines:
+            # "<id> <parent> <maj:min> <root> <mount point> <opts> [optional...] - <fstype> <source> <super opts>"
+            fields, sep, tail = line.partition(' - ')
+            fields = fields.split()
+            tail = tail.split()
+            if not sep or len(fields) < 5 or len(tail) < 2:
+                continue
+            mount_point = _MOUNTINFO_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 8)), fields[4])
+            mounts.setdefault(tail[1], mount_point)
+        return mounts
+
+    @staticmethod
+    def _mount_path(block_device, mounts):
+        # Prefer the kernel's view, falling back to udisks2 for sources it names differently
+        mount_path = mounts.get(block_device['path'])
+        if mount_path is None and block_device.get('mounted', False):
+            mount_path = block_device.get('mount_path')
+        return mount_path
+
     def check_and_handle_mounted_partitions(self, device_path, dest, success_callback):
         if self.logger:
             self.logger.info(f"Checking for mounted devices/partitions on device: {device_path}")
         
         mounted_partitions = []
+        # Read the live mount table once per check, so a retry after unmounting sees fresh state
+        mounts = self.load_mounts()
         
-        for block_device in self.block_devices:
-            if ((block_device['path'] == device_path or block_device['path'].startswith(device_path)) and 
-                block_device.get('mounted', False) and 
-                block_device.get('mount_path')):
-                
-                mount_path = block_device['mount_path']
-                
-                critical_mounts = ['/', '/home', '/boot', '/usr', '/var', '/tmp', '/opt']
+        critical_mounts = self._CRITICAL_MOUNTS
+        # Narrow to the target device first (startswith() also covers the device
+        # itself), then resolve mount points only for those, lazily
+        targets = (block_device for block_device in self.block_devices if block_device['path'].startswith(device_path))
+        mounted = ((block_device['path'], self._mount_path(block_device, mounts)) for block_device in targets)
+        for path, mount_path in mounted:
+            if mount_path:
                 if mount_path in critical_mounts:
                     if self.logger:
-                        self.logger.error(f"Critical system partition detected: {block_device['path']} mounted at {mount_path}")
-                    self.parent_window.app_controller.toast(f"Cannot proceed: Critical system partition {block_device['path']} is mounted at {mount_path}")
+                        self.logger.error(f"Critical system partition detected: {path} mounted at {mount_path}")
+                    self.parent_window.app_controller.toast(f"Cannot proceed: Critical system partition {path} is mounted at {mount_path}")
                     return False
                 
                 if self.logger:
-                    device_type = "device" if block_device['path'] == device_path else "partition"
-                    self.logger.warning(f"Found mounted {device_type}: {block_device['path']} → {mount_path}")
+                    device_type = "device" if path == device_path else "partition"
+                    self.logger.warning(f"Found mounted {device_type}: {path} → {mount_path}")
                 mounted_partitions.append({
-                    'path': block_device['path'],
+                    'path': path,
                     'mount_path': mount_path
                 })
         
@@ -94,44 +145,81 @@ class MountedPartitionChecker:
         dialog.set_default_response("unmount")
         dialog.set_close_response("cancel")
         
-        def on_response(dialog, response):
-            if self.logger:
-                self.logger.info(f"User selected dialog response: {response}")
-            
-            if response == "unmount":
-                success = True
-                failed_partitions = []
-                for partition in mounted_partitions:
-                    if not self._unmount_partition(partition['path']):
-                        success = False
-                        failed_partitions.append(partition['path'])
-                
-                if success:
-                    if self.logger:
-                        self.logger.info("All partitions unmounted successfully, proceeding with recovery")
-                    GLib.idle_add(success_callback)
-                else:
-                    if self.logger:
-                        self.logger.error(f"Failed to unmount partitions: {failed_partitions}")
-                    self.parent_window.app_controller.toast(f"Failed to unmount: {', '.join(failed_partitions)}")
-            elif response == "continue":
-                if self.logger:
-                    self.logger.warning("User chose to continue with mounted partitions - this may cause data corruption")
-                GLib.idle_add(success_callback)
-            else:  # cancel
-                if self.logger:
-                    self.logger.info("User cancelled recovery due to mounted partitions")
-        
-        dialog.connect("response", on_response)
+        ctx = _DialogCtx(tuple(mounted_partitions), device_path, dest, success_callback)
+        dialog.connect("response", self._on_unmount_response, ctx)
         dialog.present(self.parent_window)
     
-    def _unmount_partition(self, partition_path):
+    def _on_unmount_response(self, dialog, response, ctx):
+        if self.logger:
+            self.logger.info(f"User selected dialog response: {response}")
+        
+        if response == "unmount":
+            # Unmounting blocks on UDisks2 and any polkit prompt, keep it off the main loop
+            threading.Thread(target=self._unmount_all, args=(ctx,), daemon=True).start()
+        elif response == "continue":
+            if self.logger:
+                self.logger.warning("User chose to continue with mounted partitions - this may cause data corruption")
+            GLib.idle_add(ctx.success_callback)
+        else:  # cancel
+            if self.logger:
+                self.logger.info("User cancelled recovery due to mounted partitions")
+    
+    def _unmount_all(self, ctx):
+        # One partition at a time so polkit never stacks several prompts
+        bus = self._get_system_bus()
+        failed_partitions = [p['path'] for p in ctx.mounted_partitions
+                             if not self._unmount_partition(p['path'], bus)]
+        GLib.idle_add(self._on_unmount_finished, ctx, failed_partitions)
+    
+    def _on_unmount_finished(self, ctx, failed_partitions):
+        if not failed_partitions:
+            if self.logger:
+                self.logger.info("All partitions unmounted successfully, proceeding with recovery")
+            ctx.success_callback()
+        else:
+            if self.logger:
+                self.logger.error(f"Failed to unmount partitions: {failed_partitions}")
+            self.parent_window.app_controller.toast(f"Failed to unmount: {', '.join(failed_partitions)}")
+        return GLib.SOURCE_REMOVE
+    
+    def _get_system_bus(self):
+        # Connect to the system bus once and reuse it for every unmount
+        if self._bus is None:
+            try:
+                self._bus = Gio.bus_get_sync(Gio.BusType.SYSTEM, None)
+            except GLib.Error as e:
+                if self.logger:
+                    self.logger.warning(f"Could not connect to the system bus, falling back to udisksctl: {e}")
+        return self._bus
+
+    def _unmount_partition(self, partition_path, bus=None):
         if self.logger:
             self.logger.info(f"Attempting to unmount partition: {partition_path}")
+        if bus is None:
+            return self._unmount_with_udisksctl(partition_path)
+        
+        # Call UDisks2's Filesystem.Unmount directly, allowing polkit to prompt if needed
+        object_path = UDISKS2_BLOCK_DEVICES_PATH + os.path.basename(partition_path)
+        try:
+            bus.call_sync(
+                'org.freedesktop.UDisks2', object_path, 'org.freedesktop.UDisks2.Filesystem', 'Unmount',
+                GLib.Variant('(a{sv})', ({},)), None,
+                Gio.DBusCallFlags.ALLOW_INTERACTIVE_AUTHORIZATION, -1, None
+            )
+            if self.logger:
+                self.logger.info(f"Successfully unmounted {partition_path}")
+            return True
+        except GLib.Error as e:
+            if self.logger:
+                self.logger.error(f"Failed to unmount {partition_path}: {e.message}")
+            return False
+
+    def _unmount_with_udisksctl(self, partition_path):
         try:
+            # Only stderr is ever read, and only decoded when the unmount fails
             result = subprocess.run(
                 ["udisksctl", "unmount", "-b", partition_path],
-                capture_output=True, text=True
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
             )
             if result.returncode == 0:
                 if self.logger:
@@ -139,9 +227,10 @@ class MountedPartitionChecker:
                 print(f"Successfully unmounted {partition_path}")
                 return True
             else:
+                err = result.stderr.decode('utf-8', 'replace')
                 if self.logger:
-                    self.logger.error(f"Failed to unmount {partition_path}: {result.stderr}")
-                print(f"Failed to unmount {partition_path}: {result.stderr}")
+                    self.logger.error(f"Failed to unmount {partition_path}: {err}")
+                print(f"Failed to unmount {partition_path}: {err}")
                 return False
         except Exception as e:
             if self.logger:
@@ -18,10 +18,44 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import errno
+import fcntl
+import logging
 import os
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from .duplicates import remove_duplicates_with_rdfind
+from .log import flush_datarecovery_logging
+from .recover import HAS_DIGIT
+
+logger = logging.getLogger('DataRecovery')
+
+_SEP = os.sep
+
+# Extensions of ddrescue outputs in the working directory
+_IMG_MAP_EXTS = frozenset({'img', 'map'})
+
+# ioctl to share a file's extents with another (reflink), Btrfs/XFS
+_FICLONE = 0x40049409
+_COPY_CHUNK = 1 << 30
+
+# Log files to collect: (file name, name under WORKING/logs, base dirs to look in)
+_LOG_FILES = (
+    ("photorec.log", "recovery_results.log", ("current", "working", "recovery")),  # PhotoRec creates logs in recovery
+    ("results.txt", "duplicates_results.log", ("current", "working", "recovery")),  # rdfind might create logs there too
+    ("DataRecovery.log", "DataRecovery.log", ("working",)),
+    ("ddrescue.log", "ddrescue.log", ("working",)),
+)
+
+# Names already taken in each destination directory, so picking a unique
+# name does not stat the disk once per candidate
+_dir_name_cache = {}
+
+def _is_img_or_map(filename):
+    _, dot, ext = filename.rpartition('.')
+    return bool(dot) and ext in _IMG_MAP_EXTS
 
 def move_image_files_to_destination(working_dir, dest_path, device_path=None):
     try:
@@ -31,7 +65,7 @@ def move_image_files_to_destination(working_dir, dest_path, device_path=None):
         # Determine which files to move based on device type
         if device_path:
             device_name = os.path.basename(device_path)
-            is_whole_device = not any(char.isdigit() for char in device_name)
+            is_whole_device = not HAS_DIGIT(device_name)
             if is_whole_device:
                 target_files = [f"{device_name}.img", f"{device_name}.map"]
             else:
@@ -40,15 +74,17 @@ def move_image_files_to_destination(working_dir, dest_path, device_path=None):
             target_files = None
         
         moved_count = cleaned_count = 0
-        for filename in os.listdir(working_dir):
-            if filename.endswith(('.img', '.map')):
-                src_file = os.path.join(working_dir, filename)
-                if target_files is None or filename in target_files:
-                    shutil.move(src_file, os.path.join(working_dest, filename))
-                    moved_count += 1
-                else:
-                    os.remove(src_file)
-                    cleaned_count += 1
+        dest_prefix = working_dest + _SEP
+        with os.scandir(working_dir) as it:
+            for entry in it:
+                filename = entry.name
+                if _is_img_or_map(filename):
+                    if target_files is None or filename in target_files:
+                        shutil.move(entry.path, dest_prefix + filename)
+                        moved_count += 1
+                    else:
+                        os.remove(entry.path)
+                        cleaned_count += 1
         
     except Exception as e:
         pass
@@ -56,10 +92,11 @@ def move_image_files_to_destination(working_dir, dest_path, device_path=None):
 def _cleanup_image_files(working_dir):
     try:
         count = 0
-        for filename in os.listdir(working_dir):
-            if filename.endswith(('.img', '.map')):
-                os.remove(os.path.join(working_dir, filename))
-                count += 1
+        with os.scandir(working_dir) as it:
+            for entry in it:
+                if _is_img_or_map(entry.name):
+                    os.remove(entry.path)
+                    count += 1
     except Exception as e:
         pass
 
@@ -68,56 +105,138 @@ def _handle_log_files(working_path, dest_path, enable_logs):
     
     recovery_dir = os.path.join(working_path, "recovered_files")
     
-    import logging
-    logger = logging.getLogger('DataRecovery')
     logger.info("Looking for logs in:")
     logger.info(f"  Current dir: {current_dir}")
     logger.info(f"  Working path: {working_path}")
     logger.info(f"  Recovery dir: {recovery_dir}")
     
     # Look for log files in multiple locations
+    bases = {"current": current_dir, "working": working_path, "recovery": recovery_dir}
     potential_log_locations = [
-        (os.path.join(current_dir, "photorec.log"), "recovery_results.log"),
-        (os.path.join(working_path, "photorec.log"), "recovery_results.log"),
-        (os.path.join(recovery_dir, "photorec.log"), "recovery_results.log"),  # PhotoRec creates logs here
-        (os.path.join(current_dir, "results.txt"), "duplicates_results.log"), 
-        (os.path.join(working_path, "results.txt"), "duplicates_results.log"),
-        (os.path.join(recovery_dir, "results.txt"), "duplicates_results.log"),  # rdfind might create logs here too
-        (os.path.join(working_path, "DataRecovery.log"), "DataRecovery.log"),
+        (f"{bases[base]}{_SEP}{name}", dest_name)
+        for name, dest_name, base_keys in _LOG_FILES
+        for base in base_keys
     ]
     
     logs_dir = os.path.join(dest_path, "WORKING", "logs")
-    processed_files = set()  # Track processed files to avoid duplicates
-    
     if enable_logs:
         os.makedirs(logs_dir, exist_ok=True)
-        for src, dest_name in potential_log_locations:
-            if os.path.exists(src) and src not in processed_files:
-                dest_path_full = _get_unique_path(logs_dir, dest_name)
-                shutil.move(src, dest_path_full)
-                processed_files.add(src)
-                logger.info(f"Moved log file: {src} -> {dest_path_full}")  
-    else:
-        for src, _ in potential_log_locations:
+    
+    # Candidates can name the same file (e.g. cwd == working path), so
+    # track handled files by inode rather than by path
+    processed_inodes = set()
+    for src, dest_name in potential_log_locations:
+        try:
+            st = os.stat(src)
+        except OSError:
+            continue
+        key = (st.st_dev, st.st_ino)
+        if key in processed_inodes:
+            continue
+        processed_inodes.add(key)
+        
+        if enable_logs:
+            dest_path_full = _get_unique_path(logs_dir, dest_name)
+            _move_fast(src, dest_path_full)
+            logger.info(f"Moved log file: {src} -> {dest_path_full}")
+        else:
             try:
-                if os.path.exists(src) and src not in processed_files:
-                    os.remove(src)
-                    processed_files.add(src)
-                    logger.info(f"Removed log file: {src}")
-            except Exception:
-                pass
+                os.remove(src)
+            except OSError:
+                continue
+            logger.info(f"Removed log file: {src}")
+
+def _iter_files(root):
+    # Yield (path, name) for every regular file below root, reusing the
+    # scandir entry type instead of stat-ing each file like os.walk does
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        try:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path, entry.name
+        finally:
+            it.close()
+
+def _move_fast(src, dest):
+    # Rename within the filesystem; only copy the data across devices
+    try:
+        os.replace(src, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        fast_copy(src, dest)
+        os.remove(src)
+
+def fast_copy(src, dest):
+    # Reflink where the filesystem allows it, otherwise copy inside the
+    # kernel without passing the data through Python
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        dest_fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            try:
+                fcntl.ioctl(dest_fd, _FICLONE, src_fd)
+            except OSError:
+                _copy_fd_range(src_fd, dest_fd)
+        finally:
+            os.close(dest_fd)
+    finally:
+        os.close(src_fd)
+    shutil.copystat(src, dest)
+
+def _copy_fd_range(src_fd, dest_fd):
+    # Both calls continue from the current file offsets, so a failed
+    # copy_file_range can hand over to sendfile mid-file
+    try:
+        while os.copy_file_range(src_fd, dest_fd, _COPY_CHUNK):
+            pass
+        return
+    except (AttributeError, OSError) as e:
+        if isinstance(e, OSError) and e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL):
+            raise
+    while os.sendfile(dest_fd, src_fd, None, _COPY_CHUNK):
+        pass
+
+def _move_one(item):
+    src, filename, directory, lock = item
+    with lock:
+        dest = _get_unique_path(directory, filename)
+    _move_fast(src, dest)
 
 def _get_unique_path(directory, filename):
-    dest_path = os.path.join(directory, filename)
+    taken = _dir_name_cache.get(directory)
+    if taken is None:
+        try:
+            with os.scandir(directory) as it:
+                taken = {e.name for e in it}
+        except FileNotFoundError:
+            taken = set()
+        _dir_name_cache[directory] = taken
+    
+    name = filename
     counter = 1
     base_name, ext = os.path.splitext(filename)
-    while os.path.exists(dest_path):
-        new_name = f"{base_name}_{counter}{ext}"
-        dest_path = os.path.join(directory, new_name)
+    while name in taken:
+        name = f"{base_name}_{counter}{ext}"
         counter += 1
-    return dest_path
+    taken.add(name)
+    return f"{directory}{_SEP}{name}"
+
+def _invalidate_dir_cache(directory=None):
+    # Forget cached names for one directory, or for all of them
+    if directory is None:
+        _dir_name_cache.clear()
+    else:
+        _dir_name_cache.pop(directory, None)
 
-def organize_files_by_type(working_path, dest_path, enable_logs=False):
+def organize_files_by_type(working_path, dest_path, enable_logs=False, max_workers=None):
     try:
         photorec_dirs = []
         for item in os.listdir(working_path):
@@ -128,122 +247,107 @@ def organize_files_by_type(working_path, dest_path, enable_logs=False):
         if not photorec_dirs:
             return False
         
-        # Process files by extension
-        processed = 0
-        while True:
-            current_ext = None
-            files_no_ext = []
-            
-            # Find files to process
-            for dir_path in photorec_dirs:
-                for root, dirs, files in os.walk(dir_path):
-                    for file in files:
-                        if file in ["report.xml"] or file.endswith("_report.xml"):
-                            # Delete XML report files instead of moving them
-                            try:
-                                os.remove(os.path.join(root, file))
-                            except Exception:
-                                pass
-                            continue
-                        
-                        if '.' in file and not file.startswith('.'):
-                            ext = os.path.splitext(file)[1][1:].lower()
-                            if ext and not current_ext:
-                                current_ext = ext
-                        else:
-                            files_no_ext.append(os.path.join(root, file))
-            
-            # Process files without extensions first
-            if files_no_ext and not current_ext:
-                processed += _process_files_without_extension(files_no_ext, dest_path)
-                continue
-            
-            # Process files with current extension
-            if current_ext:
-                processed += _process_files_with_extension(photorec_dirs, current_ext, dest_path)
-            else:
-                break
+        # Sort every file into its destination bucket in a single traversal
+        dest_dirs = {}
+        work = []
+        for dir_path in photorec_dirs:
+            for src, file in _iter_files(dir_path):
+                if file == "report.xml" or file.endswith("_report.xml"):
+                    # Delete XML report files instead of moving them
+                    try:
+                        os.remove(src)
+                    except Exception:
+                        pass
+                    continue
+                
+                if file[:1].lower() == 'b':
+                    bucket = "corrupted"
+                elif '.' in file and not file.startswith('.'):
+                    bucket = file.rpartition('.')[2].lower() or "no_file_type"
+                else:
+                    bucket = "no_file_type"
+                
+                target = dest_dirs.get(bucket)
+                if target is None:
+                    bucket_dir = os.path.join(dest_path, bucket)
+                    os.makedirs(bucket_dir, exist_ok=True)
+                    # Name allocation within a bucket is serialised by its lock
+                    target = dest_dirs[bucket] = (bucket_dir, threading.Lock())
+                work.append((src, file) + target)
+        
+        # Moves block in the kernel, so issue them concurrently
+        workers = max_workers or max(4, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=min(32, workers)) as executor:
+            list(executor.map(_move_one, work))
         
         _cleanup_empty_dirs(photorec_dirs)
-        return processed > 0
+        return len(work) > 0
         
     except Exception as e:
         return False
 
-def _process_files_without_extension(files, dest_path):
-    no_ext_dir = os.path.join(dest_path, "no_file_type")
-    corrupted_dir = os.path.join(dest_path, "corrupted")
-    os.makedirs(no_ext_dir, exist_ok=True)
-    
-    processed = 0
-    for file_path in files:
-        filename = os.path.basename(file_path)
-        if filename.lower().startswith('b'):
-            os.makedirs(corrupted_dir, exist_ok=True)
-            dest = _get_unique_path(corrupted_dir, filename)
-        else:
-            dest = _get_unique_path(no_ext_dir, filename)
-        
-        shutil.copy2(file_path, dest)
-        os.remove(file_path)
-        processed += 1
-    
-    return processed
-
-def _process_files_with_extension(photorec_dirs, extension, dest_path):
-    filetype_dir = os.path.join(dest_path, extension)
-    corrupted_dir = os.path.join(dest_path, "corrupted")
-    os.makedirs(filetype_dir, exist_ok=True)
-    
-    processed = 0
-    for dir_path in photorec_dirs:
-        for root, dirs, files in os.walk(dir_path):
-            for file in files:
-                if file.lower().endswith(f'.{extension}'):
-                    src = os.path.join(root, file)
-                    if file.lower().startswith('b'):
-                        os.makedirs(corrupted_dir, exist_ok=True)
-                        dest = _get_unique_path(corrupted_dir, file)
-                    else:
-                        dest = _get_unique_path(filetype_dir, file)
-                    
-                    shutil.copy2(src, dest)
-                    os.remove(src)
-                    processed += 1
-    
-    return processed
-
 def _cleanup_empty_dirs(photorec_dirs):
     for dir_path in photorec_dirs:
-        for root, dirs, files in os.walk(dir_path, topdown=False):
-            for dirname in dirs:
-                try:
-                    os.rmdir(os.path.join(root, dirname))
-                except OSError:
-                    pass
-        try:
-            os.rmdir(dir_path)
-        except OSError:
-            pass
+        _rmdir_tree(dir_path)
+
+def _rmdir_tree(path):
+    # Remove empty directories bottom-up; files are never looked at, and
+    # any directory still holding one is left in place
+    try:
+        with os.scandir(path) as it:
+            subdirs = [e.path for e in it if e.is_dir(follow_symlinks=False)]
+    except OSError:
+        return
+    for subdir in subdirs:
+        _rmdir_tree(subdir)
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+def _has_recovered_files(recovery_dir):
+    # Recovered files live in PhotoRec's per-image output dirs; the top level
+    # only holds PhotoRec's own files (photorec.log with logging on). Stops at
+    # the first file found, a failed scan leaves only empty dirs
+    try:
+        with os.scandir(recovery_dir) as it:
+            subdirs = [e.path for e in it if e.is_dir(follow_symlinks=False)]
+    except OSError:
+        return False
+    return any(next(_iter_files(subdir), None) is not None for subdir in subdirs)
 
 def organize_and_cleanup(working_dir, dest_path, save_image, enable_logs=False, remove_duplicates=False, device_path=None, controller=None):
     recovery_dir = os.path.join(working_dir or dest_path, "recovered_files")
     
+    # Destination contents may have changed since the last recovery
+    _invalidate_dir_cache()
+    
     if save_image:
         move_image_files_to_destination(working_dir or dest_path, dest_path, device_path)
     else:
         _cleanup_image_files(working_dir or dest_path)
     
-    if remove_duplicates:
+    has_files = _has_recovered_files(recovery_dir)
+    
+    if remove_duplicates and has_files:
         remove_duplicates_with_rdfind(recovery_dir, controller)
     
+    # DataRecovery.log is about to be moved or removed, get all records into it first
+    flush_datarecovery_logging()
     _handle_log_files(working_dir or dest_path, dest_path, enable_logs)
     
-    success = organize_files_by_type(working_dir or dest_path, dest_path, enable_logs)
+    if has_files:
+        success = organize_files_by_type(working_dir or dest_path, dest_path, enable_logs,
+                                         getattr(controller, 'max_concurrency', None))
+    else:
+        logger.info("No recovered files to organise")
+        _cleanup_empty_dirs([recovery_dir])
+        success = False
 
     if success and working_dir:
         try:
             shutil.rmtree(working_dir)
         except Exception:
             pass
+        _invalidate_dir_cache()
     return success
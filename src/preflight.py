@@ -21,18 +21,39 @@
 import os
 import shutil
 import logging
-from typing import List, Tuple, Dict, Optional
+import time
+from typing import Iterable, List, Tuple, Dict, Optional
 
 logger = logging.getLogger('DataRecovery')
 
+# Free space results are reused for a few seconds per resolved path
+STATVFS_TTL = 5.0
+_statvfs_cache: Dict[str, Tuple[float, os.statvfs_result]] = {}
+
+# Locations of tools already found, keyed by (tool, PATH)
+_which_hits: Dict[Tuple[str, Optional[str]], str] = {}
+
+
+def _which_cached(tool: str, path: Optional[str]) -> Optional[str]:
+    # Only hits are cached, so a tool installed after a failed check is found
+    # next time. PATH is part of the key so a changed PATH is searched afresh
+    key = (tool, path)
+    found = _which_hits.get(key)
+    if found is None:
+        found = shutil.which(tool, path=path)
+        if found is not None:
+            _which_hits[key] = found
+    return found
+
 
 def check_tools_exist(tools: List[str]) -> Tuple[bool, List[str]]:
     # return (True, []) if all tools available, otherwise (False, missing_list)
-    missing = []
-    for t in tools:
-        if not shutil.which(t):
-            missing.append(t)
-    return (len(missing) == 0, missing)
+    path = os.environ.get('PATH')
+    missing = [t for t in tools if _which_cached(t, path) is None]
+    return (not missing, missing)
+
+
+check_tools_exist.cache_clear = _which_hits.clear
 
 
 def ensure_dest_writable(path: str) -> Tuple[bool, Optional[str]]:
@@ -49,7 +70,7 @@ def ensure_dest_writable(path: str) -> Tuple[bool, Optional[str]]:
 
 def check_free_space(path: str, min_bytes: int = 1 << 30) -> Tuple[bool, int]:
     try:
-        st = os.statvfs(path)
+        st = _statvfs_cached(path)
         free_bytes = st.f_bavail * st.f_frsize
         return (free_bytes >= min_bytes, free_bytes)
     except Exception:
@@ -57,13 +78,44 @@ def check_free_space(path: str, min_bytes: int = 1 << 30) -> Tuple[bool, int]:
         return (True, 0)
 
 
-def validate_partition_paths(paths: List[str]) -> Tuple[List[str], List[str]]:
+def _statvfs_cached(path: str) -> os.statvfs_result:
+    key = os.path.realpath(path)
+    now = time.monotonic()
+    cached = _statvfs_cache.get(key)
+    if cached is not None and now - cached[0] < STATVFS_TTL:
+        return cached[1]
+    st = os.statvfs(key)
+    _statvfs_cache[key] = (now, st)
+    return st
+
+
+def validate_partition_paths(paths: Iterable[str]) -> Tuple[List[str], List[str]]:
+    # Device nodes are trusted as-is. Other paths are checked against one
+    # directory listing per parent directory instead of a stat() per path.
     valid = []
     skipped = []
+    listings: Dict[str, Optional[Dict[str, os.DirEntry]]] = {}
     for p in paths:
         if p.startswith('/dev/'):
             valid.append(p)
-        elif os.path.exists(p):
+            continue
+        # Normalise first so trailing slashes and '..' split into the right parent
+        parent, name = os.path.split(os.path.normpath(p))
+        if not name:
+            # The filesystem root, nothing to look it up in
+            exists = os.path.exists(p)
+        else:
+            if parent not in listings:
+                try:
+                    with os.scandir(parent or '.') as it:
+                        listings[parent] = {e.name: e for e in it}
+                except OSError:
+                    listings[parent] = None
+            entries = listings[parent]
+            entry = entries.get(name) if entries is not None else None
+            # A listed symlink only counts if its target exists, like os.path.exists
+            exists = entry is not None and (not entry.is_symlink() or os.path.exists(p))
+        if exists:
             valid.append(p)
         else:
             skipped.append(p)
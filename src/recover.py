@@ -19,14 +19,19 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 import os
+import re
 import subprocess
 import traceback
 import logging
 import shutil
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger('DataRecovery')
 
+# Partition names contain a digit (sdb1), whole devices don't (sdb)
+HAS_DIGIT = re.compile(r'\d').search
+
 def photorec_recover(dest_path, working_dir=None, partitions_data=None, enable_logs=False, keep_corrupted_files=False, controller=None):
     try:
         logger.info("\nInitializing PhotoRec recovery...")
@@ -42,8 +47,32 @@ def photorec_recover(dest_path, working_dir=None, partitions_data=None, enable_l
         
         logger.info(f"Found {len(image_files)} image files to scan")
         
-        for image_file in image_files:
-            _scan_image_file(image_file, recovery_dir, partitions_data, enable_logs, keep_corrupted_files, controller)
+        # Index partitions by device path once for the per-image lookups
+        parts_by_path = {p.get('path'): p for p in partitions_data or ()}
+        
+        # Images are read and carved independently, so scan them side by side.
+        # With logging on every scan writes photorec.log in the same cwd, and on
+        # a spinning disk concurrent readers only thrash, so those run one at a time
+        if enable_logs or _is_rotational(working_dir or dest_path):
+            workers = 1
+        else:
+            workers = min(len(image_files), max(2, (os.cpu_count() or 1) // 2))
+        
+        # PhotoRec keeps its photorec.ses session file in cwd, so concurrent
+        # scans each get their own directory to run in
+        session_root = os.path.join(working_dir or dest_path, "photorec_sessions") if workers > 1 else None
+        
+        def scan(image_file):
+            if controller and controller.cancel_requested:
+                return False
+            return _scan_image_file(image_file, recovery_dir, parts_by_path, enable_logs, keep_corrupted_files, controller, session_root)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(scan, image_files))
+        finally:
+            if session_root:
+                shutil.rmtree(session_root, ignore_errors=True)
         
         logger.info("\nPhotoRec recovery completed successfully")
         return True
@@ -53,7 +82,7 @@ def photorec_recover(dest_path, working_dir=None, partitions_data=None, enable_l
         traceback.print_exc()
         return False
 
-def run_photorec_on_source(source_file, output_dir, description="source", enable_logs=False, keep_corrupted_files=False, filesystem_type=None, controller=None):
+def run_photorec_on_source(source_file, output_dir, description="source", enable_logs=False, keep_corrupted_files=False, filesystem_type=None, controller=None, cwd=None):
     try:
         logger.info(f"Scanning {description}: {os.path.basename(source_file)}")
 
@@ -76,30 +105,29 @@ def run_photorec_on_source(source_file, output_dir, description="source", enable
 
         logger.info(f"Command: {' '.join(cmd)}")
 
-        outdir = os.path.dirname(output_dir) or output_dir
-
-        cwd = outdir if os.path.exists(outdir) else os.getcwd()
+        if cwd is None:
+            outdir = os.path.dirname(output_dir) or output_dir
+            cwd = outdir if os.path.exists(outdir) else os.getcwd()
         logger.info(f"Running PhotoRec with cwd={cwd}")
         
         process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, cwd=cwd)
         
-        # Poll the process and check for cancellation
-        while process.poll() is None:
-            if controller and controller.cancel_requested:
-                logger.info(f"Cancellation requested, terminating PhotoRec scan of {description}")
-                process.terminate()
-                try:
-                    process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    logger.warning(f"PhotoRec scan of {description} didn't terminate gracefully, killing it")
-                    process.kill()
-                    process.wait()
-                logger.info(f"PhotoRec scan of {description} cancelled")
-                return False
-            time.sleep(1)
+        # Block until PhotoRec exits; a cancel terminates it from the callback
+        def cancel_scan():
+            _terminate_scan(process, description)
+        
+        if controller:
+            controller.register_cancel_callback(cancel_scan)
+        try:
+            stdout, stderr = process.communicate()
+        finally:
+            if controller:
+                controller.unregister_cancel_callback(cancel_scan)
+        
+        if controller and controller.cancel_requested:
+            logger.info(f"PhotoRec scan of {description} cancelled")
+            return False
         
-        # Get the results
-        stdout, stderr = process.communicate()
         result_returncode = process.returncode
 
         if stderr:
@@ -117,6 +145,36 @@ def run_photorec_on_source(source_file, output_dir, description="source", enable
         logger.debug(traceback.format_exc())
         return False
 
+def _terminate_scan(process, description):
+    if process.poll() is not None:
+        return
+    logger.info(f"Cancellation requested, terminating PhotoRec scan of {description}")
+    process.terminate()
+    
+    def kill_if_running():
+        if process.poll() is None:
+            logger.warning(f"PhotoRec scan of {description} didn't terminate gracefully, killing it")
+            process.kill()
+    
+    # Don't block the caller waiting for the scan to exit
+    timer = threading.Timer(5, kill_if_running)
+    timer.daemon = True
+    timer.start()
+
+def _is_rotational(path):
+    # Check whether the disk holding path spins, assume it does if unknown
+    # (the same rule the imaging helper applies to the source device)
+    try:
+        st = os.stat(path)
+        sys_dir = os.path.realpath(f"/sys/dev/block/{os.major(st.st_dev)}:{os.minor(st.st_dev)}")
+        if not os.path.isdir(os.path.join(sys_dir, "queue")):
+            # A partition, the queue attributes live on its disk
+            sys_dir = os.path.dirname(sys_dir)
+        with open(os.path.join(sys_dir, "queue", "rotational")) as f:
+            return f.read().strip() != '0'
+    except OSError:
+        return True
+
 def _find_image_files(working_dir):
     image_files = []
     if not working_dir or not os.path.isdir(working_dir):
@@ -124,18 +182,18 @@ def _find_image_files(working_dir):
         return image_files
 
     try:
-        for filename in os.listdir(working_dir):
-            if filename.endswith('.img'):
-                full_path = os.path.join(working_dir, filename)
-                image_files.append(full_path)
-                logger.info(f"Found image file: {filename}")
+        with os.scandir(working_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.img') and entry.is_file(follow_symlinks=False):
+                    image_files.append(entry.path)
+                    logger.info(f"Found image file: {entry.name}")
         image_files.sort()
     except Exception as e:
         logger.error(f"Failed to list image files in {working_dir}: {e}")
 
     return image_files
 
-def _scan_image_file(image_file, recovery_dir, partitions_data=None, enable_logs=False, keep_corrupted_files=False, controller=None):
+def _scan_image_file(image_file, recovery_dir, parts_by_path=None, enable_logs=False, keep_corrupted_files=False, controller=None, session_root=None):
     filename = os.path.basename(image_file)
     name_without_ext = os.path.splitext(filename)[0]
     
@@ -144,32 +202,36 @@ def _scan_image_file(image_file, recovery_dir, partitions_data=None, enable_logs
     output_dir = os.path.join(recovery_dir, name_without_ext)
     os.makedirs(output_dir, exist_ok=True)
     
-    filesystem_type = _get_filesystem_type_for_image(filename, partitions_data)
+    filesystem_type = _get_filesystem_type_for_image(filename, parts_by_path)
+    
+    cwd = None
+    if session_root:
+        cwd = os.path.join(session_root, name_without_ext)
+        os.makedirs(cwd, exist_ok=True)
     
-    success = run_photorec_on_source(image_file, output_dir, filename, enable_logs, keep_corrupted_files, filesystem_type, controller)
+    success = run_photorec_on_source(image_file, output_dir, filename, enable_logs, keep_corrupted_files, filesystem_type, controller, cwd)
     if not success:
         logger.warning(f"Scan of {filename} failed, continuing...")
         
     return success
 
-def _get_filesystem_type_for_image(filename, partitions_data):
-    if not partitions_data:
+def _get_filesystem_type_for_image(filename, parts_by_path):
+    if not parts_by_path:
         logger.info("No partitions_data provided for filesystem detection")
         return None
     
     # For partition images (e.g., sdb1.img), try to find matching partition
-    if any(char.isdigit() for char in filename):
+    if HAS_DIGIT(filename):
         device_name = filename.replace('.img', '')  # sdb1.img -> sdb1
         device_path = f"/dev/{device_name}"  # sdb1 -> /dev/sdb1
         
         logger.info(f"Looking for filesystem type of partition: {device_path}")
         
-        # Look for matching partition in the data
-        for partition in partitions_data:
-            if partition.get('path') == device_path:
-                filesystem_type = partition.get('id_type', '')
-                logger.info(f"Found filesystem type: {filesystem_type} for {device_name}")
-                return filesystem_type
+        partition = parts_by_path.get(device_path)
+        if partition is not None:
+            filesystem_type = partition.get('id_type', '')
+            logger.info(f"Found filesystem type: {filesystem_type} for {device_name}")
+            return filesystem_type
         
         logger.info(f"No filesystem data found for {device_name}")
         return None
@@ -20,7 +20,7 @@
 
 from gi.repository import Adw, Gtk, Gio
 
-from .about import about_dialog
+from .about import get_about_dialog
 from .device_dropdown import DeviceDropdownManager
 from .device_columnview import DeviceColumnViewManager
 
@@ -70,7 +70,7 @@ class DatarecoveryWindow(Adw.ApplicationWindow):
             self.set_accels_for_action(f"app.{name}", shortcuts)
     
     def on_about_action(self, *args):
-        about_dialog.present(self) 
+        get_about_dialog().present(self)
 
     def on_choose_destination(self, action, param):
         self.app_controller.choose_destination()